@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+########################################################################################################################
+#
+#  generate.py
+#
+#  Reproducible synthetic alignments for the benchmarks. Every site has an ancestral state; each taxon keeps it or,
+#	with probability divergence, has a state drawn at random from the first n_states characters of the alphabet
+#	(ACGT for up to 4 states, then digits and letters as for -c MULTI). A fraction missing of the cells is then set
+#	to ?, and optionally fractions of them to IUPAC ambiguity codes and to - gaps, and a fraction of the letters is
+#	lower-cased. The mix of invariant, singleton and variable sites is roughly that of real gene alignments.
+#
+#	Alignments are written as sequential or interleaved phylip, FASTA or NEXUS.
+#
+#	Usage: python generate.py -o outfile -t taxa -s sites [-k states] [-m missing] [-d divergence] [-a ambiguous]
+#		[-g gaps] [-l lowercase] [-f format] [--seed N]
+#
+########################################################################################################################
+
+import argparse
+
+import numpy as np
+
+DNA = "ACGT"
+MULTI = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+IUPAC = "RYKMSWNBDHV"
+
+#Characters per sequence line of the interleaved phylip and FASTA files.
+LINE_WIDTH = 60
+
+
+def alphabet(n_states):
+	"""Return the characters used for n_states states: DNA bases up to 4 states, MULTI characters above."""
+	if n_states < 1 or n_states > len(MULTI):
+		raise ValueError("Number of states must be between 1 and %d." % (len(MULTI),))
+	return DNA[:n_states] if n_states <= len(DNA) else MULTI[:n_states]
+
+
+def data_type(n_states):
+	"""Return the -c matrix character type of alignments with n_states states."""
+	return "DNA" if n_states <= len(DNA) else "MULTI"
+
+
+def generate(n_taxa, n_sites, n_states=4, missing=0.0, divergence=0.1, seed=1, ambiguous=0.0, gaps=0.0, lowercase=0.0):
+	"""Return (taxa, taxa x sites uint8 array of character codes) of a synthetic alignment.
+
+	ambiguous and gaps are the fractions of the cells set to IUPAC ambiguity codes and to -, lowercase the fraction
+	of the letters lower-cased.
+	"""
+	rng = np.random.default_rng(seed)
+	codes = np.frombuffer(alphabet(n_states).encode(), dtype=np.uint8)
+	data = np.broadcast_to(rng.integers(0, n_states, n_sites), (n_taxa, n_sites)).copy()
+	changed = rng.random((n_taxa, n_sites)) < divergence
+	data[changed] = rng.integers(0, n_states, int(changed.sum()))
+	data = codes[data]
+	data[rng.random((n_taxa, n_sites)) < missing] = ord("?")
+	#Only drawn when asked for, so the alignments of a seed stay the same without them.
+	if ambiguous:
+		cells = rng.random((n_taxa, n_sites)) < ambiguous
+		data[cells] = np.frombuffer(IUPAC.encode(), dtype=np.uint8)[rng.integers(0, len(IUPAC), int(cells.sum()))]
+	if gaps:
+		data[rng.random((n_taxa, n_sites)) < gaps] = ord("-")
+	if lowercase:
+		letters = (data >= ord("A")) & (data <= ord("Z"))
+		data[letters & (rng.random((n_taxa, n_sites)) < lowercase)] += ord("a") - ord("A")
+	return ["taxon_%d" % (taxon,) for taxon in range(n_taxa)], data
+
+
+def write_phylip(path, taxa, data):
+	"""Write a sequential phylip file."""
+	with open(path, "wb") as OUT:
+		OUT.write(("%d\t%d\n" % data.shape).encode())
+		for taxon, row in zip(taxa, data):
+			OUT.write(taxon.encode() + b"\t" + row.tobytes() + b"\n")
+
+
+def write_interleaved(path, taxa, data):
+	"""Write an interleaved phylip file, LINE_WIDTH sites per block, taxon names on the first block only."""
+	with open(path, "wb") as OUT:
+		OUT.write(("%d\t%d\n" % data.shape).encode())
+		for start in range(0, max(data.shape[1], 1), LINE_WIDTH):
+			if start:
+				OUT.write(b"\n")
+			for taxon, row in zip(taxa, data):
+				OUT.write((b"" if start else taxon.encode() + b"\t") + row[start:start + LINE_WIDTH].tobytes() + b"\n")
+
+
+def write_fasta(path, taxa, data):
+	"""Write a FASTA file, sequences wrapped at LINE_WIDTH characters."""
+	with open(path, "wb") as OUT:
+		for taxon, row in zip(taxa, data):
+			OUT.write(b">" + taxon.encode() + b"\n")
+			for start in range(0, data.shape[1], LINE_WIDTH):
+				OUT.write(row[start:start + LINE_WIDTH].tobytes() + b"\n")
+
+
+def write_nexus(path, taxa, data):
+	"""Write a NEXUS file with a DATA block, ? as its missing and - as its gap symbol."""
+	with open(path, "wb") as OUT:
+		OUT.write(b"#NEXUS\n\nBEGIN DATA;\n")
+		OUT.write(("\tDIMENSIONS NTAX=%d NCHAR=%d;\n" % data.shape).encode())
+		OUT.write(b"\tFORMAT MISSING=? GAP=-;\n\tMATRIX\n")
+		for taxon, row in zip(taxa, data):
+			OUT.write(b"\t" + taxon.encode() + b"\t" + row.tobytes() + b"\n")
+		OUT.write(b"\t;\nEND;\n")
+
+
+#Writers of the formats an alignment can be written in.
+WRITERS = {"phylip": write_phylip, "interleaved": write_interleaved, "fasta": write_fasta, "nexus": write_nexus}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("-o", required=True, help="Output alignment file")
+	parser.add_argument("-t", type=int, default=20, help="Number of taxa [20]")
+	parser.add_argument("-s", type=int, default=10000, help="Number of sites [10000]")
+	parser.add_argument("-k", type=int, default=4, help="Number of character states, DNA up to 4 [4]")
+	parser.add_argument("-m", type=float, default=0.0, help="Fraction of missing (?) cells [0]")
+	parser.add_argument("-d", type=float, default=0.1, help="Probability that a taxon differs from the ancestral state [0.1]")
+	parser.add_argument("-a", type=float, default=0.0, help="Fraction of IUPAC ambiguity code cells [0]")
+	parser.add_argument("-g", type=float, default=0.0, help="Fraction of gap (-) cells [0]")
+	parser.add_argument("-l", type=float, default=0.0, help="Fraction of lower-cased letters [0]")
+	parser.add_argument("-f", default="phylip", choices=sorted(WRITERS), help="File format [phylip]")
+	parser.add_argument("--seed", type=int, default=1, help="Random seed [1]")
+	args = parser.parse_args()
+
+	taxa, data = generate(args.t, args.s, args.k, args.m, args.d, args.seed, args.a, args.g, args.l)
+	WRITERS[args.f](args.o, taxa, data)
@@ -0,0 +1,30 @@
+########################################################################################################################
+#
+#  peak_rss.py
+#
+#  Run a command and write its peak resident memory (KB) to a JSON file, exiting with the command's status. The
+#	benchmarks start their child processes through this small process (run with python -S) rather than from the
+#	harness itself: the ru_maxrss of a child counts the memory of the process it was forked from, which for the
+#	harness, with numpy and the package loaded, is more than that of a small script. Forked from here, a child's
+#	peak is its own, or the few MB of this process if it never grows beyond them.
+#
+#	Usage: python -S benchmarks/peak_rss.py result.json command [arguments...]
+#
+########################################################################################################################
+
+import json
+import os
+import sys
+
+result, command = sys.argv[1], sys.argv[2:]
+pid = os.fork()
+if pid == 0:
+	try:
+		os.execvp(command[0], command)
+	finally:
+		os._exit(127)
+pid, status, usage = os.wait4(pid, 0)
+with open(result, "w") as OUT:
+	json.dump({"peak_rss_kb": usage.ru_maxrss}, OUT)
+code = os.waitstatus_to_exitcode(status)
+sys.exit(code if code >= 0 else 128 - code)
@@ -0,0 +1,130 @@
+########################################################################################################################
+#
+#  reference.py
+#
+#  The character by character loops of the original make_binary_matrix scripts (Method 1 version 2.2, Method 2
+#	version 1.0), kept as the reference the benchmark correctness check compares the scripts' outputs with. Only
+#	the file handling is left out: the functions take the sequences and return the text of every output file.
+#
+########################################################################################################################
+
+
+def read_alignment(path, skip_first=False):
+	"""Return (sequences, names) of a sequential phylip file: a taxon: sequence dictionary and the taxa in file order."""
+	sequences = {}
+	names = []
+	with open(path) as IN:
+		if skip_first:
+			IN.readline()
+		for Line in IN:
+			Line_bits = Line.split()
+			if len(Line_bits) < 2 or (not skip_first and Line_bits[0].isdigit() and Line_bits[1].isdigit()):
+				continue
+			sequences[Line_bits[0]] = Line_bits[1]
+			names.append(Line_bits[0])
+	return sequences, names
+
+
+def method1(sequences, names, outgroup, ambig_chars, out_file="res"):
+	"""Return {file name: text} of the eight Method 1 outputs."""
+	trans_bin_dict = dict((key, []) for key in sequences)
+	trans_bin_reduced_dict = dict((key, []) for key in sequences)
+	char_len = len(sequences[outgroup])
+
+	for char_count in range(char_len):
+		chars = []
+		for key in sequences:
+			tax_char = sequences[key][char_count].upper()
+			if (tax_char not in ambig_chars) and (tax_char not in chars):
+				chars.append(tax_char)
+
+		for character in chars:
+			for key in sequences:
+				tax_char = sequences[key][char_count].upper()
+				if tax_char == character:
+					state = "1"
+				elif tax_char in ambig_chars:
+					state = "?"
+				else:
+					state = "0"
+				trans_bin_dict[key].append(state)
+				if len(chars) > 1:	#if position is not invariant, add to reduced dataset.
+					trans_bin_reduced_dict[key].append(state)
+
+	trans_polarized_dict = dict((key, []) for key in sequences)
+	for char_count in range(len(trans_bin_dict[outgroup])):
+		out_char = trans_bin_dict[outgroup][char_count]
+		for key in trans_bin_dict:
+			tax_char = trans_bin_dict[key][char_count]
+			if out_char == "?" or tax_char == "?":
+				trans_polarized_dict[key].append("?")
+			elif tax_char == out_char:
+				trans_polarized_dict[key].append("0")
+			else:
+				trans_polarized_dict[key].append("1")
+
+	trans_polarized_reduced_dict = dict((key, []) for key in sequences)
+	for char_count in range(len(trans_bin_reduced_dict[outgroup])):
+		out_char = trans_bin_reduced_dict[outgroup][char_count]
+		if out_char == "?":		#Don't add to reduced polarized matrix.
+			continue
+		for key in trans_bin_reduced_dict:
+			tax_char = trans_bin_reduced_dict[key][char_count]
+			if tax_char == "?":
+				trans_polarized_reduced_dict[key].append("?")
+			elif tax_char == out_char:
+				trans_polarized_reduced_dict[key].append("0")
+			else:
+				trans_polarized_reduced_dict[key].append("1")
+
+	outputs = {}
+	for suffix, matrix in [(".binary.all", trans_bin_dict), (".binary.reduced", trans_bin_reduced_dict),
+			(".binary.polarized", trans_polarized_dict), (".binary.polarized.reduced", trans_polarized_reduced_dict)]:
+		phy = ["%d\t%d\n" % (len(sequences), len(matrix[names[-1]]))]
+		csv = []
+		for name in names:
+			phy.append("%s\t%s\n" % (name, "".join(matrix[name])))
+			csv.append("%s\t%s\n" % (name, "".join("," + state for state in matrix[name])))
+		outputs[out_file + suffix + ".phy"] = "".join(phy)
+		outputs[out_file + suffix + ".csv"] = "".join(csv)
+	return outputs
+
+
+def method2(sequences, names, outgroup, out_file="res"):
+	"""Return {file name: text} of the four Method 2 outputs (phylip headers as with -p y)."""
+	trans_seq_dict = dict((key, []) for key in sequences)
+	trans_bin_dict = dict((key, []) for key in sequences)
+	trans_uib_dict = dict((key, []) for key in sequences)
+
+	for base_count in range(len(sequences[outgroup])):
+		out_base = sequences[outgroup][base_count].upper()
+		bases = []
+		for key in sequences:
+			tax_base = sequences[key][base_count].upper()
+			if (tax_base != out_base) and (tax_base in ["G", "A", "T", "C"]) and (tax_base not in bases):
+				bases.append(tax_base)
+
+		for nuc in bases:
+			for key in sequences:
+				tax_base = sequences[key][base_count].upper()
+				if tax_base == out_base:
+					seq, binary = out_base, "0"
+				elif tax_base == nuc:
+					seq, binary = nuc, "1"
+				else:
+					seq, binary = "?", "?"
+				trans_seq_dict[key].append(seq)
+				trans_uib_dict[key].append(seq)
+				trans_bin_dict[key].append(binary)
+
+		for key in sequences:		#Add extra column with Outgroup base or ? to the UIB dataset
+			tax_base = sequences[key][base_count].upper()
+			trans_uib_dict[key].append(out_base if tax_base == out_base else "?")
+
+	outputs = {}
+	for file_name, matrix in [(out_file, trans_seq_dict), ("binary." + out_file, trans_bin_dict), ("uib." + out_file, trans_uib_dict)]:
+		lines = ["%d\t%d\n" % (len(sequences), len(matrix[names[-1]]))]
+		lines.extend("%s\t%s\n" % (name, "".join(matrix[name])) for name in names)
+		outputs[file_name] = "".join(lines)
+	outputs["binary." + out_file + ".csv"] = "".join("%s%s\n" % (name, "".join("," + state for state in trans_bin_dict[name])) for name in names)
+	return outputs
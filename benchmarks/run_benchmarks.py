@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+########################################################################################################################
+#
+#  run_benchmarks.py
+#
+#  Scaling benchmarks of Method 1 and Method 2. For every point of a taxa x sites x states x missing data grid a
+#	synthetic alignment is generated (generate.py) and recoded:
+#	- cli: by the make_binary_matrix script, in a child process, outputs written,
+#	- library: by binary_matrix.binarize()/binarize_uib() on the parsed alignment, in a child process, no outputs.
+#	Wall time, throughput (sites/s) and the peak resident memory of the child (measured by peak_rss.py) are recorded
+#	as JSON. The time is the best of --repeat runs; the cli time includes interpreter start up and that of
+#	peak_rss.py, a few ms.
+#
+#	--check compares the outputs of the scripts (default, -j 2 and --stream) on small alignments with those of the
+#	original character by character loops (reference.py) and exits with status 1 if any differ. Some of the
+#	alignments also have IUPAC ambiguity codes, gaps and lower-case letters, and are read as interleaved phylip,
+#	FASTA and NEXUS too and recoded through --cache (twice, copied and linked, and after linked outputs were
+#	overwritten by a run of another alignment), --index/--append and a --stream --checkpoint run, plain and with
+#	-z gz, killed part way and carried on with --resume.
+#
+#	Usage: python benchmarks/run_benchmarks.py [-t 10,100] [-s 1000,100000] [-k 4] [-m 0,0.1] [-r 3] [-o results.json]
+#		python benchmarks/run_benchmarks.py --check
+#
+########################################################################################################################
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import generate
+import reference
+from binary_matrix import AMBIGUOUS, binarize, binarize_uib, parse_alignment, polarize, reduce_invariant
+from binary_matrix.checkpoint import MANIFEST
+from binary_matrix.compress import open_input
+
+PEAK_RSS = os.path.join(REPO, "benchmarks", "peak_rss.py")
+SCRIPTS = {1: os.path.join(REPO, "make_binary_matrix_Method_1.py"), 2: os.path.join(REPO, "make_binary_matrix_Method_2.py")}
+
+#Small alignments of the correctness check: (taxa, sites, states, missing, ambiguous, gaps, lowercase), see
+#generate.generate(). The scripts recode them by default, with -j 2 and with --stream.
+CHECK_GRID = [(8, 200, 2, 0.0, 0.0, 0.0, 0.0), (8, 200, 4, 0.2, 0.0, 0.0, 0.0), (13, 150, 4, 0.05, 0.0, 0.0, 0.0),
+	(6, 120, 7, 0.1, 0.0, 0.0, 0.0)]
+
+#Alignments also read as interleaved phylip, FASTA and NEXUS, and recoded through --cache, --append and --resume.
+CHECK_FULL = [(12, 180, 4, 0.05, 0.1, 0.1, 0.3), (7, 130, 12, 0.05, 0.0, 0.05, 0.3)]
+
+CHECK_WINDOW = "37"
+
+#Taxa of a CHECK_FULL alignment left out of the first run of the --append check and appended by the second.
+CHECK_APPENDED = 3
+
+
+def run_process(command, cwd, check=True):
+	"""Run a command, returning (wall seconds, peak RSS of the process in KB, its output). Raises RuntimeError if it
+	fails, unless check is False. The command is started by peak_rss.py, so the peak is that of the command and not
+	of this process.
+	"""
+	handle, result = tempfile.mkstemp(suffix=".json")
+	os.close(handle)
+	try:
+		start = time.perf_counter()
+		process = subprocess.run([sys.executable, "-S", PEAK_RSS, result] + list(command), cwd=cwd, stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT)
+		seconds = time.perf_counter() - start
+		if check and process.returncode:
+			raise RuntimeError("%s failed:\n%s" % (" ".join(command), process.stdout.decode(errors="replace")[-2000:]))
+		with open(result) as IN:
+			peak = json.load(IN)["peak_rss_kb"]
+	finally:
+		os.unlink(result)
+	return seconds, peak, process.stdout
+
+
+def cli_command(method, path, n_states, extra=()):
+	command = [sys.executable, SCRIPTS[method], "-i", path, "-o", "res"]
+	if method == 1:
+		command += ["-c", generate.data_type(n_states)]
+	return command + list(extra)
+
+
+def library_run(method, path, n_states):
+	"""Recode an alignment file in this process and return the seconds it took."""
+	start = time.perf_counter()
+	alignment = parse_alignment(path)
+	if method == 1:
+		binary = binarize(alignment, data_type=generate.data_type(n_states))
+		reduced = reduce_invariant(binary)
+		for matrix in (binary, reduced, polarize(binary, alignment.last_taxon), polarize(reduced, alignment.last_taxon, drop_missing=True)):
+			matrix.compact()
+	else:
+		binarize_uib(alignment)
+	return time.perf_counter() - start
+
+
+def benchmark(grid, methods, modes, repeat, seed, log):
+	results = []
+	with tempfile.TemporaryDirectory() as work:
+		for n_taxa, n_sites, n_states, missing in grid:
+			path = os.path.join(work, "alignment.phy")
+			generate.write_phylip(path, *generate.generate(n_taxa, n_sites, n_states, missing, seed=seed))
+			for method, mode in itertools.product(methods, modes):
+				if method == 2 and generate.data_type(n_states) != "DNA":
+					continue	#Method 2 recodes DNA only.
+				times, peaks = [], []
+				for run in range(repeat):
+					if mode == "cli":
+						seconds, peak, output = run_process(cli_command(method, path, n_states), work)
+					else:
+						elapsed, peak, output = run_process([sys.executable, os.path.abspath(__file__), "--library",
+							str(method), path, str(n_states)], work)
+						seconds = json.loads(output.decode().splitlines()[-1])["seconds"]
+					times.append(seconds)
+					peaks.append(peak)
+				result = dict(method=method, mode=mode, taxa=n_taxa, sites=n_sites, states=n_states, missing=missing,
+					seconds=min(times), times=times, sites_per_second=n_sites / min(times), peak_rss_kb=max(peaks))
+				log("Method %d %-7s %6d taxa %9d sites %2d states %.2f missing: %8.3f s %12.0f sites/s %8d KB" % (method,
+					mode, n_taxa, n_sites, n_states, missing, result["seconds"], result["sites_per_second"], result["peak_rss_kb"]))
+				results.append(result)
+	return results
+
+
+def interrupt(saves, argv):
+	"""Run a script (argv: the script and its arguments) in this process and kill the process as the script makes its
+	checkpoint save number saves + 1: stopped after writing a window whose progress it has not saved yet.
+	"""
+	import runpy
+	import signal
+
+	from binary_matrix.checkpoint import Checkpoint
+
+	save = Checkpoint.save
+	calls = []
+
+	def killing_save(self, *args, **kwargs):
+		calls.append(None)
+		if len(calls) > saves:
+			os.kill(os.getpid(), signal.SIGKILL)
+		return save(self, *args, **kwargs)
+
+	Checkpoint.save = killing_save
+	sys.argv = list(argv)
+	runpy.run_path(argv[0], run_name="__main__")
+
+
+def check_cases(work, method, path, taxa, data, n_states, other):
+	"""Return the (options, runs, compress) of the runs of a CHECK_FULL alignment beyond the CHECK_GRID options: runs
+	is a list of (command, killed) made one after the other in the same directory, killed for a run stopped at a
+	checkpoint (see interrupt()); the outputs of the last, compressed with compress if it is not None, are compared.
+	"""
+	cases = []
+	for fmt in ("interleaved", "fasta", "nexus"):
+		fmt_path = os.path.join(work, "alignment." + fmt)
+		generate.WRITERS[fmt](fmt_path, taxa, data)
+		cases.append((fmt + " input", [(cli_command(method, fmt_path, n_states), False)], None))
+	for extra in [("--cache", "cache"), ("--cache", "cache", "--cache-link")]:
+		command = cli_command(method, path, n_states, extra)
+		cases.append((" ".join(extra[:1] + extra[2:]) + " twice", [(command, False), (command, False)], None))
+	#Outputs linked from the cache, then overwritten by a run of another alignment, must leave the cache as it was.
+	linked = cli_command(method, path, n_states, ["--cache", "cache", "--cache-link"])
+	cases.append(("--cache-link, other input", [(linked, False), (linked, False), (cli_command(method, other, n_states), False),
+		(cli_command(method, path, n_states, ["--cache", "cache"]), False)], None))
+	for compress in (None, "gz"):
+		resume = ["--stream", "--window", CHECK_WINDOW, "--checkpoint", "checkpoint"] + (["-z", compress] if compress else [])
+		killed = [sys.executable, os.path.abspath(__file__), "--interrupt", "2"] + cli_command(method, path, n_states,
+			resume)[1:]
+		cases.append((" ".join(["--stream --resume"] + resume[5:]), [(killed, True), (cli_command(method, path, n_states,
+			resume + ["--resume"]), False)], compress))
+	return cases
+
+
+def check(seed, log):
+	"""Compare the script outputs with reference.py on CHECK_GRID and CHECK_FULL, returning a list of failures."""
+	failures = []
+
+	def compare(method, options, run_dir, expected, shape, compress=None):
+		differ = []
+		for name, text in sorted(expected.items()):
+			with open_input(os.path.join(run_dir, name + ("." + compress if compress else ""))) as handle:
+				if handle.read().decode() != text:
+					differ.append(name)
+		log("Method %d %-30s %3d taxa %4d sites %2d states: %s" % ((method, options) + shape +
+			("differs in " + ", ".join(differ) if differ else "ok",)))
+		failures.extend("Method %d %s on %d taxa x %d sites, %d states: %s" % ((method, options) + shape + (name,))
+			for name in differ)
+
+	with tempfile.TemporaryDirectory() as work:
+		for grid, point in [(CHECK_GRID, point) for point in CHECK_GRID] + [(CHECK_FULL, point) for point in CHECK_FULL]:
+			n_taxa, n_sites, n_states, missing, ambiguous, gaps, lowercase = point
+			shape = (n_taxa, n_sites, n_states)
+			taxa, data = generate.generate(n_taxa, n_sites, n_states, missing, 0.3, seed, ambiguous, gaps, lowercase)
+			path = os.path.join(work, "alignment.phy")
+			generate.write_phylip(path, taxa, data)
+			sequences, names = reference.read_alignment(path)
+			other = os.path.join(work, "other.phy")
+			generate.write_phylip(other, *generate.generate(n_taxa, n_sites, n_states, missing, 0.3, seed + 1, ambiguous,
+				gaps, lowercase))
+			ambig_chars = AMBIGUOUS[generate.data_type(n_states)]
+			expected = {1: reference.method1(sequences, names, names[-1], ambig_chars)}
+			if generate.data_type(n_states) == "DNA":
+				expected[2] = reference.method2(sequences, names, names[-1])
+			for method in sorted(expected):
+				cases = [(" ".join(extra) or "default", [(cli_command(method, path, n_states, extra), False)], None)
+					for extra in [(), ("-j", "2", "--window", CHECK_WINDOW), ("--stream", "--window", CHECK_WINDOW)]]
+				if grid is CHECK_FULL:
+					cases += check_cases(work, method, path, taxa, data, n_states, other)
+				for options, runs, compress in cases:
+					run_dir = tempfile.mkdtemp(dir=work)
+					for command, killed in runs:
+						run_process(command, run_dir, check=not killed)
+						if killed and not os.path.exists(os.path.join(run_dir, "checkpoint", MANIFEST)):
+							failures.append("Method %d %s: the first run left no checkpoint to resume." % (method, options))
+					compare(method, options, run_dir, expected[method], shape, compress)
+
+			if grid is CHECK_FULL:
+				#--append of the last taxa to the others, polarized against the last of the others as the first run was.
+				first, added = os.path.join(work, "first.phy"), os.path.join(work, "added.phy")
+				generate.write_phylip(first, taxa[:-CHECK_APPENDED], data[:-CHECK_APPENDED])
+				generate.write_phylip(added, taxa[-CHECK_APPENDED:], data[-CHECK_APPENDED:])
+				run_dir = tempfile.mkdtemp(dir=work)
+				run_process(cli_command(1, first, n_states, ["--index"]), run_dir)
+				run_process(cli_command(1, added, n_states, ["--append"]), run_dir)
+				compare(1, "--index, --append", run_dir, reference.method1(sequences, names, names[-1 - CHECK_APPENDED],
+					ambig_chars), shape)
+	return failures
+
+
+if __name__ == "__main__":
+	if len(sys.argv) == 5 and sys.argv[1] == "--library":		#Child process of a library benchmark.
+		print(json.dumps({"seconds": library_run(int(sys.argv[2]), sys.argv[3], int(sys.argv[4]))}))
+		sys.exit(0)
+	if len(sys.argv) > 3 and sys.argv[1] == "--interrupt":		#Child process of a --resume check, killed part way.
+		interrupt(int(sys.argv[2]), sys.argv[3:])
+		sys.exit(0)
+
+	numbers = lambda kind: lambda text: [kind(value) for value in text.split(",")]
+	parser = argparse.ArgumentParser()
+	parser.add_argument("-t", type=numbers(int), default=[10, 100], help="Numbers of taxa [10,100]")
+	parser.add_argument("-s", type=numbers(int), default=[1000, 100000], help="Numbers of sites [1000,100000]")
+	parser.add_argument("-k", type=numbers(int), default=[4], help="Numbers of character states [4]")
+	parser.add_argument("-m", type=numbers(float), default=[0.0, 0.1], help="Fractions of missing cells [0,0.1]")
+	parser.add_argument("-r", type=int, default=3, help="Runs per benchmark, the best time is kept [3]")
+	parser.add_argument("--methods", type=numbers(int), default=[1, 2], help="Methods to run [1,2]")
+	parser.add_argument("--modes", type=numbers(str), default=["cli", "library"], help="cli and/or library [cli,library]")
+	parser.add_argument("--seed", type=int, default=1, help="Random seed of the alignments [1]")
+	parser.add_argument("-o", help="JSON results file, printed if not given")
+	parser.add_argument("--check", action="store_true", help="Only compare the scripts' outputs with the original loops")
+	args = parser.parse_args()
+
+	log = lambda message: print(message, file=sys.stderr)
+	if args.check:
+		failures = check(args.seed, log)
+		for failure in failures:
+			log("FAILED: %s" % (failure,))
+		sys.exit(1 if failures else 0)
+
+	results = {
+		"python": platform.python_version(),
+		"numpy": np.__version__,
+		"platform": platform.platform(),
+		"cpus": os.cpu_count(),
+		"results": benchmark(list(itertools.product(args.t, args.s, args.k, args.m)), args.methods, args.modes, args.r, args.seed, log),
+	}
+	if args.o:
+		with open(args.o, "w") as OUT:
+			json.dump(results, OUT, indent=1)
+	else:
+		print(json.dumps(results, indent=1))
@@ -0,0 +1,32 @@
+########################################################################################################################
+#
+#  binary_matrix
+#
+#  Array based engine shared by the make_binary_matrix scripts. The alignment is held as a taxa x sites uint8 array of
+#	upper-cased character codes and every binary matrix is built from it with numpy operations, column block by
+#	column block, instead of growing one Python string per taxon.
+#
+#  The functions below work on in-memory alignments and matrices, so many alignments can be recoded in one process:
+#
+#	alignment = parse_alignment("gene.phy")
+#	binary = binarize(alignment, data_type="DNA")
+#	polarized = polarize(reduce_invariant(binary), alignment.last_taxon, drop_missing=True)
+#	uib = binarize_uib(alignment)
+#	distances = distance_matrix(polarized, "hamming")
+#	for weights in column_weights(polarized, Resampling("bootstrap", 1000, seed=1), alignment.n_sites): ...
+#
+#  method1.run() and method2.run() do everything the two scripts do.
+#
+########################################################################################################################
+
+from binary_matrix.alignment import Alignment, parse_alignment
+from binary_matrix.distance import distance_matrix
+from binary_matrix.engine import AMBIGUOUS, binarize, polarize, polarize_all, reduce_invariant
+from binary_matrix.matrix import BinaryMatrix, OneHotMatrix, load_npz, save_npz
+from binary_matrix.resample import Resampling, column_weights, replicate_weights
+from binary_matrix.uib import SiteBases, UIBMatrices, binarize_uib
+
+__all__ = ["AMBIGUOUS", "Alignment", "BinaryMatrix", "OneHotMatrix", "Resampling", "SiteBases", "UIBMatrices",
+	"binarize", "binarize_uib", "column_weights", "distance_matrix", "load_npz", "parse_alignment", "polarize",
+	"polarize_all", "reduce_invariant", "replicate_weights", "save_npz"]
+
@@ -0,0 +1,255 @@
+########################################################################################################################
+#
+#  alignment.py
+#
+#  In-memory alignments. parse_alignment() reads an alignment file once, line by line, and keeps both the taxon order
+#	of the file and the sequences, decoded through a translation table (upper-casing by default) into a taxa x sites
+#	uint8 array of character codes. The format is recognised from the first line:
+#	- ">name" starts a FASTA file, sequences may span several lines,
+#	- "#NEXUS" starts a NEXUS file, the MATRIX of its DATA or CHARACTERS block is read (interleaved or not, with its
+#		MISSING, GAP and MATCHCHAR symbols),
+#	- "ntax nchar" is a phylip header. The file is interleaved phylip if the first ntax sequences are shorter than
+#		nchar and more sequence lines follow, sequential phylip otherwise,
+#	- anything else is simple "name sequence" text.
+#
+#  gzip, bzip2 and xz compressed files are decompressed as they are read (see compress.py).
+#
+########################################################################################################################
+
+import itertools
+import re
+
+import numpy as np
+
+from binary_matrix.compress import open_input
+
+#Phylip header line: number of taxa and number of characters.
+PHYLIP_HEADER = re.compile(br"\s*(\d+)\s+(\d+)\s*$")
+
+_NEXUS_BLOCK = re.compile(br"begin\s+(?:data|characters)\s*;(.*?)\bend(?:block)?\s*;", re.I | re.S)
+_NEXUS_COMMENT = re.compile(br"\[[^\]]*\]")
+_NEXUS_MATRIX = re.compile(br"\bmatrix\b(.*?);", re.I | re.S)
+_NEXUS_NAME = re.compile(br"\s*('(?:[^']|'')*'|\S+)")
+
+#Lookup table that upper-cases ASCII letter codes.
+UPPER = np.arange(256, dtype=np.uint8)
+UPPER[ord("a"):ord("z") + 1] -= ord("a") - ord("A")
+
+
+class Alignment(object):
+	"""Sequences of equal length, one row of data per distinct taxon.
+
+	taxa lists each distinct taxon once, in dictionary order (the row order of data). names lists the taxon of every
+	sequence line of the input in file order, which is the order outputs are written in; as with a dictionary, a
+	repeated taxon keeps its last sequence. last_taxon is the taxon of the last line, the default outgroup. format is
+	the format the input was read as: "text", "phylip", "interleaved phylip", "fasta" or "nexus".
+	"""
+
+	def __init__(self, taxa, data, names=None, format="text"):
+		self.taxa = list(taxa)
+		self.data = data
+		self.names = list(taxa) if names is None else names
+		self.format = format
+
+	@classmethod
+	def from_sequences(cls, sequences):
+		"""Build an alignment from a dictionary (or list of pairs) of taxon names and sequences."""
+		sequences = dict(sequences)
+		taxa = list(sequences)
+		return cls(taxa, encode([sequences[taxon] for taxon in taxa]))
+
+	@property
+	def n_taxa(self):
+		return len(self.taxa)
+
+	@property
+	def n_sites(self):
+		return self.data.shape[1]
+
+	@property
+	def last_taxon(self):
+		return self.names[-1] if self.names else None
+
+	def row(self, taxon):
+		"""Return the data row of a taxon."""
+		try:
+			return self.taxa.index(taxon)
+		except ValueError:
+			raise KeyError("Taxon %s is not in the alignment." % (taxon,))
+
+
+def encode(seqs):
+	"""Encode equal length sequences as a taxa x sites uint8 array of upper-cased character codes."""
+	data = np.empty((len(seqs), len(seqs[0]) if seqs else 0), dtype=np.uint8)
+	for row, seq in enumerate(seqs):
+		data[row] = np.frombuffer(seq.encode("latin-1"), dtype=np.uint8)
+	return UPPER[data]
+
+
+def translation_table(mapping=None):
+	"""Return a uint8 lookup table that upper-cases letters and then maps the characters of mapping to others.
+
+	mapping is a dictionary of single characters, e.g. {"-": "?"} to read gaps as missing data.
+	"""
+	table = UPPER.copy()
+	for char, replacement in (mapping or {}).items():
+		table[UPPER == UPPER[ord(char)]] = ord(replacement)
+	return table
+
+
+def detect_format(line):
+	"""Return the format an alignment starting with this (non-blank, bytes) line is in, as far as one line tells."""
+	if line.lstrip().startswith(b">"):
+		return "fasta"
+	if line.lstrip().lower().startswith(b"#nexus"):
+		return "nexus"
+	if PHYLIP_HEADER.match(line):
+		return "phylip"
+	return "text"
+
+
+def parse_alignment(source, header="detect", table=None):
+	"""Read an alignment from a file name (possibly of a compressed file) or an iterable of lines (an open file, a list
+	of strings or bytes...).
+
+	header selects how a phylip header is recognised in phylip and text input: "detect" takes a first line holding
+	two numbers as the header, "first" skips the first line whatever it holds (Method 2 -p y) and None reads every
+	line as a sequence. table is a 256 entry uint8 lookup table the characters are decoded through, by default
+	UPPER (see translation_table()). Raises ValueError if the sequences differ in length.
+	"""
+	if isinstance(source, str):
+		with open_input(source) as handle:
+			return parse_alignment(handle, header, table)
+	if table is None:
+		table = UPPER
+
+	lines = (line if isinstance(line, bytes) else line.encode("latin-1") for line in source)
+	first = b""
+	for first in lines:
+		if first.strip():
+			break
+	format = detect_format(first) if first.strip() else "text"
+
+	if format == "fasta":
+		records = _read_fasta(first, lines)
+	elif format == "nexus":
+		records, mapping, match = _read_nexus(first, lines)
+		table = table.copy()
+		for char, replacement in mapping.items():
+			table[UPPER == UPPER[char]] = table[replacement]
+	else:
+		sizes = None
+		if header == "first" or (header == "detect" and format == "phylip"):
+			numbers = PHYLIP_HEADER.match(first)
+			sizes = (int(numbers.group(1)), int(numbers.group(2))) if numbers else None
+			first = b""
+		else:
+			format = "text"
+		records, interleaved = _read_phylip(first, lines, sizes)
+		if interleaved:
+			format = "interleaved phylip"
+		elif sizes is None:
+			format = "text"
+
+	sequences = {}
+	names = []
+	n_sites = None
+	for name, seq in records:
+		if n_sites is None:
+			n_sites = len(seq)
+		elif len(seq) != n_sites:
+			raise ValueError("Error, %s has different number of characters (%d is not %d)" % (name, n_sites, len(seq)))
+		sequences[name] = seq
+		names.append(name)
+
+	taxa = list(sequences)
+	data = table[np.frombuffer(b"".join(sequences[taxon] for taxon in taxa), dtype=np.uint8)].reshape(len(taxa), n_sites or 0)
+	if format == "nexus" and match is not None and len(taxa):	#Match characters stand for the first taxon's character.
+		matching = data == table[UPPER[match]]
+		data[matching] = np.broadcast_to(data[0], data.shape)[matching]
+	return Alignment(taxa, data, names, format)
+
+
+def _read_phylip(first, lines, sizes):
+	#Return ([(name, sequence)...], interleaved) from "name sequence" lines. With a header (ntax, nchar) and the first
+	#ntax sequences shorter than nchar, the lines after them carry the next pieces of the sequences, taxon by taxon.
+	records = []
+	pieces = []		#Sequence parts of the first ntax lines, spaces removed, in case the file is interleaved.
+	short = False
+	interleaved = False
+	block = 0
+	for line in itertools.chain([first] if first else [], lines):
+		if not interleaved:
+			if not line.strip() or (line[:1].isspace() and not short):
+				continue
+			if not short:
+				fields = line.split(None, 2)
+				records.append((fields[0].decode(), fields[1] if len(fields) > 1 else b""))
+				if sizes is not None and len(pieces) < sizes[0]:
+					pieces.append((records[-1][0], [b"".join(line.split()[1:])]))
+					short = len(pieces) == sizes[0] and all(len(parts[0]) < sizes[1] for name, parts in pieces)
+				continue
+			interleaved = True
+		chunk = line.split()
+		if not chunk:
+			continue
+		name, parts = pieces[block % len(pieces)]
+		if len(chunk) > 1 and chunk[0].decode() == name:	#Some programs repeat the names in every block.
+			chunk = chunk[1:]
+		parts.append(b"".join(chunk))
+		block += 1
+	if interleaved:
+		return [(name, b"".join(parts)) for name, parts in pieces], True
+	return records, False
+
+
+def _read_fasta(first, lines):
+	#Return [(name, sequence)...] of ">name description" records, sequences possibly spread over several lines.
+	records = []
+	parts = None
+	for line in itertools.chain([first], lines):
+		if line.lstrip().startswith(b">"):
+			parts = []
+			records.append((line.lstrip()[1:].split(None, 1)[0].decode() if line.strip() != b">" else "", parts))
+		elif parts is not None:
+			parts.append(b"".join(line.split()))
+	return [(name, b"".join(parts)) for name, parts in records]
+
+
+def _read_nexus(first, lines):
+	#Return ([(name, sequence)...], {symbol code: replacement code}, match character code or None) from the MATRIX of
+	#the first DATA or CHARACTERS block. Rows are gathered by taxon name, so interleaved matrices need no special case;
+	#in a sequential matrix a row that is shorter than NCHAR continues on the next lines.
+	text = _NEXUS_COMMENT.sub(b"", b"".join(itertools.chain([first], lines)))
+	block = _NEXUS_BLOCK.search(text)
+	matrix = _NEXUS_MATRIX.search(block.group(1)) if block else None
+	if matrix is None:
+		raise ValueError("Error, no DATA or CHARACTERS block with a MATRIX in the NEXUS file")
+	commands = block.group(1)[:matrix.start()]
+	option = lambda key: re.search(br"\b" + key + br"\s*=\s*(\d+|'.'|\S)", commands, re.I)
+
+	nchar = option(b"nchar")
+	nchar = int(nchar.group(1)) if nchar else None
+	interleaved = re.search(br"\binterleave\b(?!\s*=\s*no)", commands, re.I) is not None
+	mapping = {}
+	for key, replacement in ((b"missing", b"?"), (b"gap", b"-")):
+		symbol = option(key)
+		if symbol:
+			mapping[symbol.group(1).strip(b"'")[0]] = replacement[0]
+	match = option(b"matchchar")
+	match = match.group(1).strip(b"'")[0] if match else None
+
+	sequences = {}
+	current = None
+	for line in matrix.group(1).splitlines():
+		if not line.strip():
+			continue
+		if current is not None and not interleaved and nchar is not None and len(b"".join(sequences[current])) < nchar:
+			sequences[current].append(b"".join(line.split()))
+			continue
+		name = _NEXUS_NAME.match(line)
+		current = name.group(1).decode()
+		if current.startswith("'"):
+			current = current[1:-1].replace("''", "'")
+		sequences.setdefault(current, []).append(b"".join(line[name.end():].split()))
+	return [(name, b"".join(parts)) for name, parts in sequences.items()], mapping, match
@@ -0,0 +1,159 @@
+########################################################################################################################
+#
+#  batch.py
+#
+#  Binary supermatrix of many gene alignments (loci). Every locus is read once and recoded into a Method 1 matrix by
+#	a pool of worker processes, the matrices are joined side by side in the order the loci were given, taxa missing
+#	from a locus getting ? in all of its columns, and a partition file records the binary columns of each locus.
+#
+########################################################################################################################
+
+import functools
+import multiprocessing
+import os
+
+from binary_matrix.alignment import parse_alignment
+from binary_matrix.compress import compression
+from binary_matrix.engine import AMBIGUOUS, MATRICES, binarize, polarize, reduce_invariant
+from binary_matrix.matrix import hstack
+from binary_matrix.stats import Stats
+from binary_matrix.util import quiet
+from binary_matrix.writers import write_matrix
+
+
+def locus_files(paths):
+	"""Expand directories in paths to the files they hold (sorted by name, hidden files left out)."""
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+				if not name.startswith(".") and os.path.isfile(os.path.join(path, name)))
+		else:
+			files.append(path)
+	return files
+
+
+def locus_name(path):
+	"""Return the name of the locus in a file: the file name without its extension (and compression suffix)."""
+	name = os.path.basename(path)
+	if compression(name) is not None:
+		name = name.rsplit(".", 1)[0]
+	return os.path.splitext(name)[0]
+
+
+def recode_locus(path, ambig_chars, matrix="all"):
+	"""Return (n_sites, binary matrix) of one locus file, unpolarized: the polarized matrices are of the all or
+	reduced matrix returned, polarized against the outgroup of the whole supermatrix (see polarize_locus()).
+	"""
+	try:
+		alignment = parse_alignment(path)
+		binary = binarize(alignment, ambig_chars)
+		if matrix in ("reduced", "polarized.reduced"):
+			binary = reduce_invariant(binary)
+	except (ValueError, KeyError) as error:
+		raise ValueError("%s: %s" % (path, error.args[0]))
+	return alignment.n_sites, binary.compact()
+
+
+def supermatrix_outgroup(loci):
+	"""Return the outgroup of a polarized supermatrix: the last taxon of the first locus that is in every locus.
+
+	loci are the binary matrices of the loci. Raises ValueError if no taxon is in every locus.
+	"""
+	common = set(loci[0].taxa)
+	for binary in loci[1:]:
+		common &= set(binary.taxa)
+	for taxon in reversed(loci[0].taxa):
+		if taxon in common:
+			return taxon
+	raise ValueError("No taxon is in every locus, give the outgroup of the polarized supermatrix with -g.")
+
+
+def polarize_locus(binary, matrix, outgroup):
+	"""Polarize the all or reduced matrix of a locus (see recode_locus()) against the outgroup taxon."""
+	return polarize(binary, outgroup, drop_missing=(matrix == "polarized.reduced")).compact()
+
+
+def supermatrix(paths, ambig_chars=AMBIGUOUS["DNA"], matrix="all", outgroup=None, n_jobs=1, log=quiet):
+	"""Recode the locus files and join them, returning (supermatrix, partitions, names).
+
+	The supermatrix rows are every taxon seen, in order of first appearance. partitions lists the (locus name,
+	first column, last column) of every locus with at least one binary column, columns numbered from 1, and names
+	the loci joined.
+
+	Polarized matrices are polarized against one outgroup for all of the loci, by default the last taxon of the first
+	locus that is in every locus (see supermatrix_outgroup()). Loci without the outgroup are left out and logged.
+	"""
+	if matrix not in MATRICES:
+		raise ValueError("Matrix %s is not one of %s." % (matrix, ", ".join(MATRICES)))
+	recode = functools.partial(recode_locus, ambig_chars=ambig_chars, matrix=matrix)
+	if n_jobs > 1:
+		with multiprocessing.Pool(n_jobs) as pool:
+			loci = pool.map(recode, paths)
+	else:
+		loci = [recode(path) for path in paths]
+	names = [locus_name(path) for path in paths]
+
+	if matrix in ("polarized", "polarized.reduced"):
+		if outgroup is None:
+			outgroup = supermatrix_outgroup([binary for n_sites, binary in loci])
+		log("The outgroup taxon is %s." % (outgroup,))
+		polarized = []
+		for name, (n_sites, binary) in zip(names, loci):
+			if outgroup in binary.taxa:
+				polarized.append((name, n_sites, polarize_locus(binary, matrix, outgroup)))
+			else:
+				log("Locus %s does not have the outgroup %s, it is left out of the supermatrix." % (name, outgroup))
+		if not polarized:
+			raise ValueError("No locus has the outgroup %s." % (outgroup,))
+		loci = [(n_sites, binary) for name, n_sites, binary in polarized]
+		names = [name for name, n_sites, binary in polarized]
+
+	taxa = []
+	seen = set()
+	for n_sites, binary in loci:
+		for taxon in binary.taxa:
+			if taxon not in seen:
+				seen.add(taxon)
+				taxa.append(taxon)
+
+	partitions = []
+	offsets = []
+	first_site, first_column = 0, 1
+	for name, (n_sites, binary) in zip(names, loci):
+		log("Locus %s: %d taxa, %d sites, %d binary columns." % (name, binary.n_taxa, n_sites, binary.n_columns))
+		if binary.n_columns:
+			partitions.append((name, first_column, first_column + binary.n_columns - 1))
+		offsets.append(first_site)
+		first_site += n_sites
+		first_column += binary.n_columns
+	return hstack([binary.with_taxa(taxa) for n_sites, binary in loci], offsets), partitions, names
+
+
+def write_partitions(path, partitions):
+	"""Write a RAxML style partition file, one "BIN, locus = first-last" line per locus."""
+	with open(path, "w") as OUT:
+		for name, first, last in partitions:
+			OUT.write("BIN, %s = %d-%d\n" % (name, first, last))
+
+
+def run(paths, out_file, ambig_chars=AMBIGUOUS["DNA"], matrix="all", outgroup=None, n_jobs=1, log=quiet, stats=None):
+	"""Write the supermatrix of the loci in paths (files or directories of files) as out_file.phy and out_file.csv,
+	and its partitions as out_file.partitions. stats is a stats.Stats object recording the stages and counts.
+	"""
+	stats = Stats() if stats is None else stats
+	paths = locus_files(paths)
+	if not paths:
+		raise ValueError("No alignment files were given.")
+	with stats.stage("recode"):
+		binary, partitions, names = supermatrix(paths, ambig_chars, matrix, outgroup, n_jobs, log)
+	stats.count(loci=len(names), dropped_loci=len(paths) - len(names), taxa=binary.n_taxa, binary_columns=binary.n_columns)
+	rows = range(binary.n_taxa)
+	with stats.stage("write"):
+		write_matrix(out_file + ".phy", binary, binary.taxa, rows, n_taxa=binary.n_taxa, n_jobs=n_jobs)
+		write_matrix(out_file + ".csv", binary, binary.taxa, rows, csv=True, n_jobs=n_jobs)
+		write_partitions(out_file + ".partitions", partitions)
+	log("Supermatrix of %d taxa and %d binary columns from %d loci." % (binary.n_taxa, binary.n_columns, len(names)))
+	if len(names) < len(paths):
+		log("%d of the %d loci were left out for lacking the outgroup." % (len(paths) - len(names), len(paths)))
+	log("\nFinished\n")
@@ -0,0 +1,145 @@
+########################################################################################################################
+#
+#  cache.py
+#
+#  On-disk cache of run outputs. An entry is keyed on the SHA-256 of the input file and of the options that change
+#	the outputs (method, ambiguous characters, outgroup, ...), and holds the output files, the log messages and the
+#	counts of the run that made them. A later run with the same key copies (or hard-links) the files to its own
+#	output names and replays the messages instead of recoding.
+#
+#  Entries are written to a temporary directory and renamed into place, so concurrent runs never see half an entry.
+#	The cache is kept under a size limit by removing the least recently used entries after every store.
+#
+#  Cached files are read-only, and the outputs linked to them with them. Every output is written to a new file
+#	(util.detach() removes whatever is at its path first), so a later run writing the same output names replaces the
+#	links instead of writing through them into the cache.
+#
+########################################################################################################################
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from binary_matrix.util import detach
+
+#Bumped whenever the outputs for the same input and options change, so old entries are no longer used.
+CACHE_VERSION = 1
+
+#Default size limit of a cache, in bytes.
+DEFAULT_SIZE = 10 * 1024 ** 3
+
+_CHUNK = 1 << 20
+_META = "meta.json"
+
+
+class ResultCache(object):
+	"""A directory of cached run outputs holding at most max_bytes of files.
+
+	With link, outputs are hard-linked from the cache rather than copied when it is on the same file system. The
+	outputs then share the cached files and are read-only like them.
+	"""
+
+	def __init__(self, directory, max_bytes=DEFAULT_SIZE, link=False):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.link = link
+		os.makedirs(directory, exist_ok=True)
+
+	def key(self, in_file, **options):
+		"""Return the key of the outputs of in_file with the given options (JSON serializable values)."""
+		digest = hashlib.sha256()
+		with open(in_file, "rb") as IN:
+			for chunk in iter(lambda: IN.read(_CHUNK), b""):
+				digest.update(chunk)
+		options = json.dumps(dict(options, cache_version=CACHE_VERSION), sort_keys=True)
+		return hashlib.sha256(digest.hexdigest().encode() + options.encode()).hexdigest()
+
+	def fetch(self, key, paths):
+		"""Put the outputs of key at paths, returning {"log": messages, "counts": counts}, or None if key is not cached."""
+		entry = os.path.join(self.directory, key)
+		try:
+			with open(os.path.join(entry, _META)) as IN:
+				meta = json.load(IN)
+			if meta["files"] != len(paths):
+				return None
+			for index, path in enumerate(paths):
+				self._put(os.path.join(entry, str(index)), path)
+			os.utime(os.path.join(entry, _META))	#Most recently used.
+		except (OSError, ValueError, KeyError):	#Not cached, or evicted while being read.
+			return None
+		return meta
+
+	def store(self, key, paths, log, counts):
+		"""Cache the output files at paths with the log messages and counts of the run, then evict old entries."""
+		entry = os.path.join(self.directory, key)
+		work = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+		try:
+			for index, path in enumerate(paths):
+				shutil.copyfile(path, os.path.join(work, str(index)))
+				os.chmod(os.path.join(work, str(index)), 0o444)
+			with open(os.path.join(work, _META), "w") as OUT:
+				json.dump({"files": len(paths), "log": log, "counts": counts}, OUT)
+			os.rename(work, entry)
+		except OSError:		#An output is missing or another run stored the same key first.
+			shutil.rmtree(work, ignore_errors=True)
+		self.evict()
+
+	def evict(self):
+		"""Remove the least recently used entries until the cache holds at most max_bytes."""
+		entries = []
+		total = 0
+		for item in os.scandir(self.directory):
+			if item.name.startswith(".") or not item.is_dir():
+				continue
+			try:
+				size = sum(part.stat().st_size for part in os.scandir(item.path))
+				used = os.stat(os.path.join(item.path, _META)).st_mtime
+			except OSError:
+				continue
+			entries.append((used, size, item.path))
+			total += size
+		for used, size, path in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			shutil.rmtree(path, ignore_errors=True)
+			total -= size
+
+	def _put(self, cached, path):
+		detach(path)
+		if self.link:
+			try:
+				os.link(cached, path)
+				return
+			except OSError:
+				pass
+		shutil.copyfile(cached, path)
+
+
+def cached_run(cache, in_file, options, paths, log, stats, compute):
+	"""Run compute(log), which writes the output files at paths, through the cache.
+
+	If the outputs of in_file and options are cached they are restored and the messages of the run that made them
+	are passed to log again; otherwise compute runs and its outputs, messages and counts are cached.
+	"""
+	if cache is None:
+		return compute(log)
+	with stats.stage("cache_lookup"):
+		key = cache.key(in_file, **options)
+		meta = cache.fetch(key, paths)
+	if meta is not None:
+		log("Outputs restored from the cache in %s." % (cache.directory,))
+		for message in meta["log"]:
+			log(message)
+		stats.count(**meta["counts"])
+		return
+
+	messages = []
+	def record(message):
+		messages.append(message)
+		log(message)
+	before = dict(stats.counts)
+	compute(record)
+	with stats.stage("cache_store"):
+		cache.store(key, paths, messages, dict((name, value - before.get(name, 0)) for name, value in stats.counts.items()))
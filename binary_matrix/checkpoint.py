@@ -0,0 +1,113 @@
+########################################################################################################################
+#
+#  checkpoint.py
+#
+#  Checkpoints of runs recoded window by window (--stream). Their outputs are laid out up front and every window's
+#	columns are written straight to their place, so the outputs themselves hold the finished windows: a checkpoint
+#	flushes them to disk and records in a small manifest the first site not yet recoded and what the run needs to
+#	carry on (column counts of the first pass, bytes written per output row, ...). Arrays summed over the windows,
+#	such as the pair counts of the distances, are saved next to it.
+#
+#  A resumed run checks that the manifest is of the same input file, options and output files, reopens the outputs as they are and
+#	starts at the first unfinished window. The manifest is replaced atomically and names the arrays file saved with
+#	it, so a run killed at any point leaves a consistent checkpoint and only loses the window it was writing.
+#
+########################################################################################################################
+
+import json
+import os
+
+import numpy as np
+
+#Bumped whenever the manifest or the outputs it describes change, so old checkpoints are not resumed.
+CHECKPOINT_VERSION = 3
+
+MANIFEST = "manifest.json"
+
+
+class Checkpoint(object):
+	"""The checkpoint directory of a run of in_file with options (JSON serializable values) writing the files outputs.
+
+	With resume, the checkpoint a run of the same input, options and outputs left in directory is loaded, if there is
+	one: resumed is then True, position the first site not yet recoded, state the state saved with it and arrays its
+	arrays. Otherwise position is 0 and state None, and a checkpoint already in directory is replaced by the first save(). Raises
+	ValueError if the checkpoint to resume is of another input, other options or other outputs, or if one of its
+	outputs is gone.
+	"""
+
+	def __init__(self, directory, in_file, options, outputs=(), resume=False):
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		info = os.stat(in_file)
+		self._run = json.loads(json.dumps(dict(input=os.path.abspath(in_file), size=info.st_size, mtime_ns=info.st_mtime_ns,
+			options=options, outputs=[os.path.abspath(path) for path in outputs], version=CHECKPOINT_VERSION)))
+		self.position = 0
+		self.state = None
+		self.arrays = {}
+		self.resumed = False
+		self._arrays_file = None
+		self._load(resume)
+
+	def _load(self, resume):
+		try:
+			with open(os.path.join(self.directory, MANIFEST)) as IN:
+				manifest = json.load(IN)
+		except FileNotFoundError:
+			return
+		self._arrays_file = manifest["arrays"]		#Removed by the next save() if the run starts again.
+		if not resume:
+			return
+		run = manifest["run"]
+		if run.get("version") == self._run["version"] and run["outputs"] != self._run["outputs"]:
+			theirs, ours = next((a, b) for a, b in zip(run["outputs"] + [None], self._run["outputs"] + [None]) if a != b)
+			raise ValueError("The checkpoint in %s is of a run writing other outputs (%s, not %s), resume with the same -o "
+				"or remove it to start again." % (self.directory, theirs, ours))
+		if run != self._run:
+			raise ValueError("The checkpoint in %s is of another input file or other options, remove it to start again."
+				% (self.directory,))
+		for path in manifest["filled"]:
+			if not os.path.exists(path):
+				raise ValueError("%s is not laid out for this matrix and cannot be filled further, remove the checkpoint to "
+					"start again." % (path,))
+		self.resumed = True
+		self.position = manifest["position"]
+		self.state = manifest["state"]
+		if self._arrays_file is not None:
+			with np.load(os.path.join(self.directory, self._arrays_file)) as archive:
+				self.arrays = dict(archive)
+
+	def save(self, position, state, files=(), arrays=None):
+		"""Record that every site before position is done: flush files (objects with sync() and a path) to disk, save
+		the JSON serializable state and the {name: array} arrays, then replace the manifest. The manifest lists the
+		paths of files, the files being filled (the uncompressed copies of compressed outputs), which a resumed run
+		reopens.
+		"""
+		for OUT in files:
+			OUT.sync()
+		previous, self._arrays_file = self._arrays_file, None
+		if arrays:
+			self._arrays_file = "arrays.%d.npz" % (position,)
+			with open(os.path.join(self.directory, self._arrays_file), "wb") as OUT:
+				np.savez(OUT, **arrays)
+				OUT.flush()
+				os.fsync(OUT.fileno())
+		manifest = os.path.join(self.directory, MANIFEST)
+		with open(manifest + ".tmp", "w") as OUT:
+			json.dump(dict(run=self._run, position=position, state=state, arrays=self._arrays_file,
+				filled=[os.path.abspath(filled.path) for filled in files]), OUT)
+			OUT.flush()
+			os.fsync(OUT.fileno())
+		os.replace(manifest + ".tmp", manifest)
+		if previous is not None and previous != self._arrays_file:
+			os.unlink(os.path.join(self.directory, previous))
+		self.position, self.state = position, state
+
+	def remove(self):
+		"""Remove the checkpoint of a finished run, and its directory if nothing else is in it."""
+		for name in (MANIFEST, self._arrays_file):
+			if name is not None and os.path.exists(os.path.join(self.directory, name)):
+				os.unlink(os.path.join(self.directory, name))
+		try:
+			os.rmdir(self.directory)
+		except OSError:
+			pass
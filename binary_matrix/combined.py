@@ -0,0 +1,107 @@
+########################################################################################################################
+#
+#  combined.py
+#
+#  The Method 1 and Method 2 outputs of an alignment from one read of it. The file is parsed and integer-coded once,
+#	and every block of sites is cut into its distinct site patterns and scanned once for the row in which each
+#	character is first seen (the state table, engine.first_rows()). The table orders the states of the Method 1
+#	one-hot columns and, expanded from the patterns back to the sites, the bases of the Method 2 columns, so neither
+#	method scans the alignment again. With n_jobs > 1 the blocks are recoded by a pool of processes.
+#
+########################################################################################################################
+
+import numpy as np
+
+from binary_matrix import engine, method1, method2, uib
+from binary_matrix.alignment import parse_alignment
+from binary_matrix.matrix import hstack
+from binary_matrix.parallel import map_windows
+from binary_matrix.stats import Stats
+from binary_matrix.stream import window_size
+from binary_matrix.util import quiet
+
+
+def state_table(data, ambiguous):
+	"""Return (patterns, inverse, codes, first) for a taxa x sites block: its site patterns (engine.site_patterns())
+	and their state table for codes, the codes of the patterns that are not ambiguous and the bases of Method 2.
+	"""
+	patterns, inverse, weights = engine.site_patterns(data, ambiguous)
+	present = np.bincount(patterns.ravel(), minlength=256) > 0
+	codes = np.union1d(np.flatnonzero(present & ~ambiguous), uib.BASES[~ambiguous[uib.BASES]]).astype(np.uint8)
+	return patterns, inverse, codes, engine.first_rows(patterns, codes)
+
+
+def recode_block(data, ambiguous, outgroups, matrices, uib_outgroup):
+	"""Return (the Method 1 matrices of engine.recode_block(), the Method 2 blocks of uib.recode_block()) of a taxa x
+	sites block, both from one state_table().
+	"""
+	patterns, inverse, codes, first = state_table(data, ambiguous)
+	binary = engine.expand(engine.one_hot(patterns, ambiguous, patterns=False, table=(codes, first)), inverse)
+	bases_first = None
+	if not ambiguous[uib.BASES].any():	#Ambiguous bases are collapsed in the patterns, Method 2 then scans the sites.
+		bases_first = first[np.searchsorted(codes, uib.BASES)][:, inverse]
+	return engine.derive(binary, outgroups, matrices), uib.recode_block(data, uib_outgroup, bases_first)
+
+
+def run(in_file, out_file, ambig_chars, outgroup=None, outputs=None, npz=False, window=None, n_jobs=1, log=quiet,
+		stats=None, verbosity=0, compress=None):
+	"""Write the Method 1 outputs (see method1.run()) and the Method 2 outputs (see method2.run(), with phylip headers)
+	of in_file, reading and scanning it once.
+
+	outgroup is a taxon or a list of taxa to polarize the Method 1 matrices against, by default the last taxon of the
+	file; Method 2 is recoded relative to the first of them. outputs selects the Method 1 outputs (see
+	method1.parse_outputs()). With n_jobs > 1 blocks of window sites are recoded by n_jobs processes and the outputs
+	written by n_jobs threads. With verbosity 1 the bases of every site are logged as by Method 2. compress ("gz",
+	"bz2" or "xz") compresses the text outputs. Raises ValueError for sequences of different lengths or an unknown
+	output and KeyError for an unknown outgroup.
+	"""
+	outputs = method1.parse_outputs(outputs, npz)
+	stats = Stats() if stats is None else stats
+	outgroups = None if outgroup is None else [outgroup] if isinstance(outgroup, str) else list(outgroup)
+	matrices = [matrix for matrix in engine.MATRICES if matrix in outputs]
+
+	with stats.stage("parse"):
+		alignment = parse_alignment(in_file)
+	stats.count(taxa=len(alignment.taxa), sites=alignment.n_sites)
+	if alignment.format != "text":
+		log("Input file detected as %s format." % (alignment.format,))
+	log("All input character sets should be %s characters long." % (alignment.n_sites,))
+	if outgroups is None:
+		outgroups = [alignment.last_taxon]
+	if len(outgroups) == 1:
+		log("The outgroup taxon is %s." % (outgroups[0],))
+	else:
+		log("The outgroup taxa are %s, Method 2 is recoded relative to %s." % (", ".join(outgroups), outgroups[0]))
+	out_rows = [alignment.row(taxon) for taxon in outgroups]
+	ambiguous = engine.ambiguity_table(ambig_chars)
+
+	#One block of the whole alignment unless the blocks are shared out to processes.
+	size = window_size(alignment.n_taxa, window) if n_jobs > 1 else max(alignment.n_sites, 1)
+	starts, method1_blocks, method2_blocks = [], [], []
+	with stats.stage("recode"):
+		for start, (recoded, block) in map_windows(recode_block, alignment.data, n_jobs, size,
+				(ambiguous, out_rows, matrices, out_rows[0])):
+			if verbosity >= 1:
+				method2.log_bases(log, start, block[3])
+			starts.append(start)
+			method1_blocks.append(recoded)
+			method2_blocks.append(block)
+		joined = {}
+		recoded = [blocks[0] if len(blocks) == 1 else hstack(blocks, starts, joined) for blocks in zip(*method1_blocks)]
+		stack = lambda blocks: np.hstack(blocks) if blocks else np.empty((alignment.n_taxa, 0), dtype=np.uint8)
+		sequence, binary, uib_matrix, bases = zip(*method2_blocks) if method2_blocks else ([], [], [], [])
+		uib_matrices = uib.UIBMatrices(stack(sequence), stack(binary), stack(uib_matrix), uib.join_bases(bases))
+	for matrix in recoded:
+		matrix.taxa = alignment.taxa
+	stats.count(method2_binary_columns=uib_matrices.binary.shape[1], uib_columns=uib_matrices.uib.shape[1],
+		invariant_sites=uib_matrices.bases.invariant())
+
+	#Output lines are written in the order of the input file.
+	rows = [alignment.row(name) for name in alignment.names]
+	files = method1.output_files(out_file, outgroups, matrices)
+	n_columns = method1.write_outputs(files, outputs, recoded, alignment.names, rows, n_jobs, stats, compress)
+	method1.count_columns(stats, outgroups, files, n_columns)
+	with stats.stage("write_method2"):
+		method2.write_outputs(method2.output_files(out_file, compress), uib_matrices, alignment.names, rows,
+			len(alignment.taxa), n_jobs, compress)
+	log("\nFinished\n")
@@ -0,0 +1,144 @@
+########################################################################################################################
+#
+#  compress.py
+#
+#  Compressed input and output. Inputs compressed with gzip, bzip2 or xz are recognised from their first bytes and
+#	decompressed as they are read, whatever their name.
+#
+#  Outputs are compressed in independent blocks by a pool of threads while the main thread goes on producing the
+#	text (zlib, bz2 and lzma release the interpreter lock). Concatenated members are still one valid file for gzip,
+#	bzip2 and xz:
+#	- gzip output is BGZF, the blocked gzip of samtools/tabix: 64 KB blocks that each are a gzip member recording
+#		its own size, ended by the empty BGZF end of file block,
+#	- bzip2 and xz output is a bzip2 stream or xz stream per MB of text, as pbzip2 and pixz write them.
+#
+########################################################################################################################
+
+import bz2
+import collections
+import gzip
+import lzma
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from multiprocessing.pool import ThreadPool
+
+from binary_matrix.util import detach
+
+#Output compressions, by file name suffix.
+COMPRESSIONS = ["gz", "bz2", "xz"]
+
+#First bytes of the compressed files.
+_MAGIC = [(b"\x1f\x8b", gzip.open), (b"BZh", bz2.open), (b"\xfd7zXZ\x00", lzma.open)]
+
+#BGZF blocks hold at most 0xff00 bytes of text, so a block stays under 64 KB even if it does not compress.
+_BGZF_TEXT = 0xff00
+_BGZF_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+_BGZF_EOF = _BGZF_HEADER + b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+
+_CHUNK = 1 << 20
+
+
+def open_input(path):
+	"""Open a file for reading bytes, decompressing it on the fly if it is gzip, bzip2 or xz compressed."""
+	with open(path, "rb") as handle:
+		start = handle.read(6)
+	for magic, opener in _MAGIC:
+		if start.startswith(magic):
+			return opener(path, "rb")
+	return open(path, "rb")
+
+
+def is_compressed(path):
+	"""Return True if the file is gzip, bzip2 or xz compressed."""
+	with open(path, "rb") as handle:
+		start = handle.read(6)
+	return any(start.startswith(magic) for magic, opener in _MAGIC)
+
+
+def decompressed_copy(path):
+	"""Decompress a file to a temporary file and return its name; the caller removes it."""
+	handle, copy = tempfile.mkstemp(prefix=".binary_matrix-", suffix="." + os.path.basename(path))
+	with open_input(path) as IN, os.fdopen(handle, "wb") as OUT:
+		shutil.copyfileobj(IN, OUT, _CHUNK)
+	return copy
+
+
+def compression(path):
+	"""Return the compression a file name's suffix names ("gz", "bz2" or "xz"), None if it has none."""
+	suffix = path.rsplit(".", 1)[-1]
+	return suffix if suffix in COMPRESSIONS and "." in path else None
+
+
+def _bgzf_block(text):
+	deflate = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+	data = deflate.compress(text) + deflate.flush()
+	trailer = struct.pack("<II", zlib.crc32(text), len(text))
+	return _BGZF_HEADER + struct.pack("<H", len(_BGZF_HEADER) + 2 + len(data) + len(trailer) - 1) + data + trailer
+
+
+_BLOCKS = {"gz": (_BGZF_TEXT, _bgzf_block), "bz2": (_CHUNK, bz2.compress), "xz": (_CHUNK, lzma.compress)}
+
+
+class CompressedWriter(object):
+	"""A file written through write() and compressed in blocks by a pool of threads, in the compress compression
+	("gz", "bz2" or "xz"). At most two blocks per thread wait to be written at a time.
+	"""
+
+	def __init__(self, path, compress, threads=1):
+		self.block_size, self._compress = _BLOCKS[compress]
+		self._gzip = compress == "gz"
+		detach(path)
+		self._file = open(path, "wb")
+		self._pool = ThreadPool(max(threads, 1))
+		self._threads = max(threads, 1)
+		self._pending = collections.deque()
+		self._buffer = bytearray()
+
+	def write(self, data):
+		"""Append bytes (or a uint8 array) to the text."""
+		self._buffer += memoryview(data)
+		while len(self._buffer) >= self.block_size:
+			self._submit(bytes(self._buffer[:self.block_size]))
+			del self._buffer[:self.block_size]
+
+	def _submit(self, text):
+		self._pending.append(self._pool.apply_async(self._compress, (text,)))
+		while len(self._pending) > 2 * self._threads:
+			self._file.write(self._pending.popleft().get())
+
+	def close(self):
+		"""Compress and write the rest of the text and close the file."""
+		try:
+			if self._buffer:
+				self._submit(bytes(self._buffer))
+			while self._pending:
+				self._file.write(self._pending.popleft().get())
+			if self._gzip:
+				self._file.write(_BGZF_EOF)
+		finally:
+			self._pool.terminate()
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+def open_output(path, compress=None, threads=1):
+	"""Open an output file for writing bytes, a CompressedWriter with a compress compression."""
+	if compress is not None:
+		return CompressedWriter(path, compress, threads)
+	detach(path)
+	return open(path, "wb")
+
+
+def compress_file(source, path, compress, threads=1):
+	"""Write the copy of the file source compressed with compress to path (see CompressedWriter)."""
+	with open(source, "rb") as IN, CompressedWriter(path, compress, threads) as OUT:
+		for chunk in iter(lambda: IN.read(_CHUNK), b""):
+			OUT.write(chunk)
@@ -0,0 +1,146 @@
+########################################################################################################################
+#
+#  distance.py
+#
+#  Pairwise distances between the taxa of a binary matrix, skipping ? cells:
+#	- hamming: the fraction of the columns where neither taxon is ? in which the two differ (p-distance),
+#	- jaccard: the same differences over the columns where neither is ? and at least one is 1.
+#
+#  The 0/1 cells and the ? mask are packed 64 columns to a word, so a pair of taxa is compared with XOR/AND and a
+#	popcount per word. Taxa are compared block against block, and columns are packed a chunk at a time, so the
+#	temporaries stay small whatever the size of the matrix; the blocks are shared out to threads (numpy releases the
+#	interpreter lock). The counts of differences and of compared columns add up over columns, so a matrix recoded
+#	window by window can be counted window by window (see pair_counts()).
+#
+########################################################################################################################
+
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from binary_matrix.compress import open_output
+
+#Distance metrics.
+METRICS = ["hamming", "jaccard"]
+
+#Taxa per block and columns packed at a time: a block pair's temporaries are _TAXA x _TAXA x _COLUMNS / 64 words.
+_TAXA = 64
+_COLUMNS = 1 << 14
+
+_ZERO, _DOT, _SPACE, _NEWLINE = (ord(c) for c in "0. \n")
+
+if hasattr(np, "bitwise_count"):
+	def _popcount(words):
+		return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+	_BITS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+	def _popcount(words):
+		return _BITS[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def pair_counts(matrix, metric="hamming", n_jobs=1, counts=None):
+	"""Return (differences, compared): taxa x taxa counts of the columns in which two taxa differ and of the columns
+	they are compared on for the metric, counted by n_jobs threads.
+
+	With counts, the (differences, compared) of other columns of the same taxa, the counts are added to them.
+	"""
+	if metric not in METRICS:
+		raise ValueError("Distance metric %s is not one of %s." % (metric, ", ".join(METRICS)))
+	n_taxa = matrix.n_taxa
+	if counts is None:
+		counts = (np.zeros((n_taxa, n_taxa), dtype=np.int64), np.zeros((n_taxa, n_taxa), dtype=np.int64))
+	blocks = [(first, second) for first in range(0, n_taxa, _TAXA) for second in range(first, n_taxa, _TAXA)]
+	pool = ThreadPool(n_jobs) if n_jobs > 1 else None
+	try:
+		for start in range(0, matrix.n_columns, _COLUMNS):
+			values, present = _words(matrix.select(slice(start, start + _COLUMNS)))
+			count = lambda block: _count_block(values, present, block[0], block[1], metric, counts)
+			if pool is not None:
+				pool.map(count, blocks)
+			else:
+				for block in blocks:
+					count(block)
+	finally:
+		if pool is not None:
+			pool.terminate()
+	return counts
+
+
+def distances(counts):
+	"""Return the taxa x taxa distances of the (differences, compared) counts, NaN for pairs of different taxa with
+	nothing compared.
+	"""
+	differences, compared = counts
+	distance = np.where(compared > 0, differences / np.maximum(compared, 1), np.nan)
+	np.fill_diagonal(distance, 0)
+	return distance
+
+
+def distance_matrix(matrix, metric="hamming", n_jobs=1):
+	"""Return the taxa x taxa distances between the rows of a BinaryMatrix or OneHotMatrix."""
+	return distances(pair_counts(matrix, metric, n_jobs))
+
+
+def write_distances(path, distance, names, rows, n_jobs=1, compress=None):
+	"""Write a square PHYLIP distance matrix: the number of taxa, then "name<tab>distances" lines.
+
+	names are the taxa of the output lines and rows the row of distance of each. Distances are written with six
+	decimals, pairs with no column compared as nan. With a compress compression ("gz", "bz2" or "xz") the file is
+	compressed by n_jobs threads.
+	"""
+	rows = np.asarray(rows, dtype=np.intp)
+	with open_output(path, compress, n_jobs) as OUT:
+		OUT.write(("%d\n" % (len(names),)).encode())
+		for start in range(0, len(rows), _TAXA):
+			text = _format(distance[np.ix_(rows[start:start + _TAXA], rows)])
+			for name, line in zip(names[start:start + _TAXA], text):
+				OUT.write((name + "\t").encode())
+				OUT.write(line)
+
+
+def _words(matrix):
+	#Pack the values and the presence (not ?) of the cells into 64 bit words; padding columns are absent.
+	packed = matrix.compact()
+	n_bytes = packed.values.shape[1]
+	n_words = (n_bytes + 7) // 8
+	values = np.zeros((packed.n_taxa, 8 * n_words), dtype=np.uint8)
+	present = np.zeros_like(values)
+	present[:, :n_bytes] = ~packed.missing
+	if packed.n_columns % 8:
+		present[:, n_bytes - 1] &= 0xFF << (8 - packed.n_columns % 8) & 0xFF
+	values[:, :n_bytes] = packed.values
+	values &= present
+	return values.view(np.uint64), present.view(np.uint64)
+
+
+def _count_block(values, present, first, second, metric, counts):
+	#Add the counts of the taxa of one block against those of another, and their mirror image.
+	block_1, block_2 = slice(first, first + _TAXA), slice(second, second + _TAXA)
+	compared = present[block_1, np.newaxis] & present[np.newaxis, block_2]
+	if metric == "jaccard":
+		compared &= values[block_1, np.newaxis] | values[np.newaxis, block_2]
+	differences = values[block_1, np.newaxis] ^ values[np.newaxis, block_2]
+	differences &= compared
+	for total, words in zip(counts, (differences, compared)):
+		count = _popcount(words)
+		total[block_1, block_2] += count
+		if first != second:
+			total[block_2, block_1] += count.T
+
+
+def _format(distance):
+	#Format a rows x taxa block of distances as "d.dddddd" cells separated by spaces, a line per row.
+	missing = np.isnan(distance)
+	scaled = np.rint(np.where(missing, 0, distance) * 1000000).astype(np.int64)
+	text = np.empty(distance.shape + (9,), dtype=np.uint8)
+	text[..., 0] = _ZERO + scaled // 1000000
+	text[..., 1] = _DOT
+	for place in range(6):
+		text[..., 7 - place] = _ZERO + scaled % 10
+		scaled //= 10
+	text[..., 8] = _SPACE
+	text[missing] = np.frombuffer(b"     nan ", dtype=np.uint8)
+	text = text.reshape(distance.shape[0], -1)
+	text[:, -1] = _NEWLINE
+	return text
@@ -0,0 +1,257 @@
+########################################################################################################################
+#
+#  engine.py
+#
+#  Method 1 recoding of an integer-coded alignment into one-hot binary matrices:
+#	- every site gets one binary column per character state observed in it (ambiguous characters are not states),
+#	- states of a site are ordered by the first taxon they are seen in, exactly as the original per-character loop,
+#	- a cell is 1 if the taxon has the state, ? if the taxon is ambiguous at the site and 0 otherwise.
+#
+#  The results are OneHotMatrix objects (see matrix.py): the alignment's codes and the state of every binary column,
+#	with the 0/1/? cells only worked out as they are written, so the expanded matrix is never held in memory.
+#	Real alignments repeat the same site patterns (invariant columns, singletons, ...) many times, so one_hot()
+#	keeps every distinct pattern once and maps the binary columns of the sites onto the columns of their pattern.
+#
+#  binarize(), reduce_invariant() and polarize() are the public functions; recode_block() returns the Method 1
+#	matrices of a block of sites for the scripts, running only the stages the requested matrices need.
+#
+########################################################################################################################
+
+import contextlib
+
+import numpy as np
+
+from binary_matrix.matrix import OneHotMatrix
+
+#Default ambiguous/missing characters for each matrix character type.
+AMBIGUOUS = {"DNA": "RYKMSWNBDHV?", "AA": "X?", "MULTI": "?"}
+
+#The Method 1 matrices, each with the matrix it is derived from: the stages recode_block() runs for a selection.
+MATRICES = ["all", "reduced", "polarized", "polarized.reduced"]
+DERIVED_FROM = {"all": None, "reduced": "all", "polarized": "all", "polarized.reduced": "reduced"}
+
+#Stand-in for Stats.stage() when a run is not instrumented.
+_no_stage = lambda name: contextlib.nullcontext()
+
+#Odd 64 bit multiplier of the rolling hash used to find identical site columns.
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def ambiguity_table(ambig_chars):
+	"""Return a 256 entry lookup table that is True for the codes of ambiguous/missing characters."""
+	table = np.zeros(256, dtype=bool)
+	for char in ambig_chars:
+		table[ord(char)] = True
+	return table
+
+
+def first_rows(data, codes):
+	"""Return the state table of data: a codes x sites array of the row in which each of codes is first seen at each
+	site (the number of rows if it is absent).
+	"""
+	n_taxa, n_sites = data.shape
+	first = np.full((len(codes), n_sites), n_taxa, dtype=np.intp)
+	for i, code in enumerate(codes):
+		hit = data == code
+		seen = hit.any(axis=0)
+		first[i, seen] = hit.argmax(axis=0)[seen]
+	return first
+
+
+def site_states(data, ambiguous, table=None):
+	"""Return (sites, codes): the site and state code of every binary column, in output order.
+
+	table is the (codes, first_rows()) of data if it is already known: its codes must include every code of data that
+	is not ambiguous and no ambiguous one, the others being absent.
+	"""
+	n_taxa, n_sites = data.shape
+	if table is None:
+		present = np.bincount(data.ravel(), minlength=256) > 0
+		codes = np.flatnonzero(present & ~ambiguous).astype(np.uint8)
+		first = first_rows(data, codes)
+	else:
+		codes, first = table
+
+	#Order the states of every site by first appearance, absent states sort last.
+	order = np.argsort(first, axis=0, kind="stable")
+	observed = (np.take_along_axis(first, order, axis=0) < n_taxa).T
+	sites, rank = np.nonzero(observed)
+	return sites, codes[order.T[sites, rank]]
+
+
+def one_hot(data, ambiguous, patterns=True, table=None):
+	"""Build the binary matrix with one column per observed state of every site.
+
+	With patterns, each distinct site pattern is recoded once and its columns are expanded back to the sites. Without,
+	table is the state table of data if already known (see site_states()).
+	"""
+	if patterns:
+		unique, inverse, weights = site_patterns(data, ambiguous)
+		return expand(one_hot(unique, ambiguous, patterns=False), inverse)
+	data, missing_code = collapse_ambiguous(data, ambiguous)
+	sites, codes = site_states(data, ambiguous, table)
+	return OneHotMatrix(data, missing_code, sites, codes)
+
+
+def collapse_ambiguous(data, ambiguous):
+	"""Return (data, code): the data with all ambiguous characters recoded as one code, None if there are none."""
+	if not ambiguous.any():
+		return data, None
+	code = np.flatnonzero(ambiguous)[0]
+	collapse = np.arange(256, dtype=np.uint8)
+	collapse[ambiguous] = code
+	return collapse[data], code
+
+
+def site_patterns(data, ambiguous):
+	"""Return (patterns, inverse, weights) for the distinct site columns of an alignment.
+
+	All ambiguous characters are recoded the same way, so they are first collapsed into one code. patterns is a
+	taxa x patterns array, inverse gives the pattern of every site and weights the number of sites of each pattern.
+	"""
+	data, missing_code = collapse_ambiguous(data, ambiguous)
+
+	#Hash every column, then check that columns sharing a hash really are the same pattern.
+	keys = np.zeros(data.shape[1], dtype=np.uint64)
+	for row in data:
+		keys *= _HASH_MULTIPLIER
+		keys += row
+	keys, first, inverse, weights = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+	patterns = data[:, first]
+	inverse = inverse.reshape(-1)
+	if not all(np.array_equal(row, pattern[inverse]) for row, pattern in zip(data, patterns)):
+		patterns, inverse, weights = np.unique(data, axis=1, return_inverse=True, return_counts=True)
+		inverse = inverse.reshape(-1)
+	return np.ascontiguousarray(patterns), inverse, weights		#Column gathers copy non-contiguous arrays first.
+
+
+def expand(matrix, inverse):
+	"""Expand a matrix built from site patterns back to the sites: every site gets the columns of its pattern."""
+	per_pattern = np.bincount(matrix.sites, minlength=len(inverse) and inverse.max() + 1)
+	first = np.cumsum(per_pattern) - per_pattern
+	per_site = per_pattern[inverse]
+	sites = np.repeat(np.arange(len(inverse)), per_site)
+	within = np.arange(len(sites)) - np.repeat(np.cumsum(per_site) - per_site, per_site)
+	expanded = matrix.select(first[inverse][sites] + within)
+	expanded.sites = sites
+	return expanded
+
+
+def recode_block(data, ambiguous, outgroups, matrices=MATRICES, stats=None):
+	"""Return the (all, reduced, polarized, polarized reduced) matrices of an alignment or a window of its sites.
+
+	outgroups is a row or a list of rows; with a list, a polarized and a polarized reduced matrix follow the reduced
+	matrix for every outgroup, all derived from the one unpolarized matrix. Only the MATRICES named in matrices are
+	returned (in that order) and only the stages they derive from are run. With a stats.Stats object the stages are
+	timed and the number of site patterns is counted.
+	"""
+	stage = stats.stage if stats is not None else _no_stage
+	with stage("patterns"):
+		unique, inverse, weights = site_patterns(data, ambiguous)
+	with stage("binarize"):
+		binary = expand(one_hot(unique, ambiguous, patterns=False), inverse)
+	if stats is not None:
+		stats.count(patterns=len(weights))
+	return derive(binary, outgroups, matrices, stats)
+
+
+def derive(binary, outgroups, matrices=MATRICES, stats=None):
+	"""Return the MATRICES named in matrices derived from the binary matrix, as recode_block() does."""
+	needed = set(matrices)
+	for matrix in matrices:
+		while DERIVED_FROM[matrix] is not None:
+			matrix = DERIVED_FROM[matrix]
+			needed.add(matrix)
+	stage = stats.stage if stats is not None else _no_stage
+	results = [binary] if "all" in matrices else []
+	if "reduced" in needed:
+		with stage("reduce"):
+			reduced = reduce_invariant(binary)
+		if "reduced" in matrices:
+			results.append(reduced)
+	for outgroup in _rows(outgroups):
+		if "polarized" in matrices:
+			with stage("polarize"):
+				results.append(polarize(binary, outgroup))
+		if "polarized.reduced" in matrices:
+			with stage("polarize_reduced"):
+				results.append(polarize(reduced, outgroup, drop_missing=True))
+	return results
+
+
+def binarize(alignment, ambig_chars=None, data_type="DNA"):
+	"""Recode an Alignment into its binary matrix, one column per character state observed at each site.
+
+	ambig_chars are the ambiguous/missing characters, by default those of data_type (see AMBIGUOUS).
+	"""
+	if ambig_chars is None:
+		if data_type not in AMBIGUOUS:
+			raise ValueError("Matrix character type %s is not one of DNA, AA or MULTI." % (data_type,))
+		ambig_chars = AMBIGUOUS[data_type]
+	matrix = one_hot(alignment.data, ambiguity_table(ambig_chars))
+	matrix.taxa = alignment.taxa
+	return matrix
+
+
+def reduce_invariant(matrix):
+	"""Drop the columns of invariant sites, i.e. sites with a single observed state."""
+	per_site = np.bincount(matrix.sites)
+	return matrix.select(per_site[matrix.sites] > 1)
+
+
+def polarize_all(matrix, outgroups, drop_missing=False):
+	"""Polarize the matrix against each of a list of outgroups (rows or taxon names), returning the list of matrices."""
+	return [polarize(matrix, outgroup, drop_missing) for outgroup in outgroups]
+
+
+def polarize(matrix, outgroup, drop_missing=False):
+	"""Polarize against the outgroup: 0 if the taxon matches the outgroup, 1 otherwise, ? if either is ?.
+
+	outgroup is a row of the matrix or the name of one of its taxa. With drop_missing, columns where the outgroup is
+	? are left out instead of becoming all ?.
+	"""
+	if not isinstance(outgroup, (int, np.integer)):
+		outgroup = matrix.taxa.index(outgroup)
+	if drop_missing:
+		matrix = matrix.select(~matrix.unpack(outgroup)[1])
+	return matrix.polarized(outgroup)
+
+
+def extend(matrix, data, ambiguous, taxa=None):
+	"""Return a site-indexed OneHotMatrix (columns are sites) with the rows of an alignment of the same sites added.
+
+	Only the new rows are searched for states: a state new to a site adds a column after the site's existing ones,
+	in the order the new rows show them, and the columns already there are kept as they are. taxa are the names of
+	the new rows.
+	"""
+	data, missing_code = collapse_ambiguous(data, ambiguous)
+	sites, codes = site_states(data, ambiguous)
+	keys = sites * 256 + codes
+	known = np.sort(matrix.sites * 256 + matrix.codes)
+	new = np.ones(len(keys), dtype=bool)
+	if len(known):
+		new = known[np.minimum(np.searchsorted(known, keys), len(known) - 1)] != keys
+	sites = np.concatenate([matrix.sites, sites[new]])
+	codes = np.concatenate([matrix.codes, codes[new]])
+	order = np.argsort(sites, kind="stable")	#Existing columns stay ahead of the new ones of their site.
+	return OneHotMatrix(np.vstack([matrix.data, data]), missing_code, sites[order], codes[order],
+		taxa=None if taxa is None else list(matrix.taxa) + list(taxa))
+
+
+def column_counts(data, ambiguous, outgroups):
+	"""Return the column counts of the matrices recode_block() returns, without building them.
+
+	The counts are (all, reduced, polarized reduced) for a single outgroup row, (all, reduced, polarized reduced...)
+	with one polarized reduced count per outgroup for a list of rows. Polarized matrices have as many columns as all.
+	"""
+	sites, codes = site_states(data, ambiguous)
+	per_site = np.bincount(sites, minlength=data.shape[1])
+	variable = per_site > 1
+	counts = [len(sites), int(per_site[variable].sum())]
+	for outgroup in _rows(outgroups):
+		counts.append(int(per_site[variable & ~ambiguous[data[outgroup]]].sum()))
+	return tuple(counts)
+
+
+def _rows(outgroups):
+	return [outgroups] if isinstance(outgroups, (int, np.integer)) else outgroups
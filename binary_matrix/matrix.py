@@ -0,0 +1,300 @@
+########################################################################################################################
+#
+#  matrix.py
+#
+#  Two bit per cell storage of 0/1/? binary matrices:
+#	- values: bit set if the cell is 1,
+#	- missing: bit set if the cell is ?,
+#	both packed eight columns to a byte along every taxon row (numpy.packbits). The input site of every column is kept
+#	alongside so invariant sites can still be recognised.
+#
+#  A one-hot binary matrix need not be stored at all: OneHotMatrix keeps the integer-coded alignment (or its distinct
+#	site patterns) and the state code of every binary column, and works out the 0/1/? cells of the rows or columns
+#	that are read. Both classes have the same reading interface (to_bytes(), unpack(), select(), rows(), ...).
+#
+#  Matrices are saved as uncompressed .npz archives. Their members are stored contiguously, so load_npz() can
+#	memory-map them straight from the archive instead of reading and parsing the text outputs.
+#
+########################################################################################################################
+
+import struct
+import zipfile
+
+import numpy as np
+
+from binary_matrix.util import detach
+
+_ZERO, _MISSING, _COMMA = (ord(c) for c in "0?,")
+
+#Rows unpacked at a time when a matrix is compacted, bounds the size of the unpacked temporaries.
+_ROW_BLOCK = 256
+
+
+class _Matrix(object):
+	#Reading shared by the matrix classes, on top of their to_bytes(), unpack() and select().
+
+	def compact(self):
+		"""Return the cells as a bit-packed BinaryMatrix."""
+		values = np.empty((self.n_taxa, (self.n_columns + 7) // 8), dtype=np.uint8)
+		missing = np.empty_like(values)
+		for start in range(0, self.n_taxa, _ROW_BLOCK):
+			block = slice(start, start + _ROW_BLOCK)
+			block_values, block_missing = self.unpack(block)
+			values[block] = np.packbits(block_values, axis=1)
+			missing[block] = np.packbits(block_missing, axis=1)
+		return BinaryMatrix(values, missing, self.sites, taxa=self.taxa)
+
+	def row(self, row, csv=False):
+		"""Return one taxon row as a string, optionally with every cell preceded by a comma."""
+		text = self.to_bytes(row)
+		if csv:
+			interleaved = np.empty(2 * len(text), dtype=np.uint8)
+			interleaved[0::2] = _COMMA
+			interleaved[1::2] = text
+			text = interleaved
+		return text.tobytes().decode("ascii")
+
+	def rows(self, csv=False):
+		"""Iterate over the taxon rows as strings."""
+		for row in range(self.n_taxa):
+			yield self.row(row, csv)
+
+	def column_blocks(self, size, rows=slice(None)):
+		"""Iterate over (first column, rows x columns uint8 characters) blocks of at most size columns."""
+		for start in range(0, self.n_columns, size):
+			yield start, self.select(slice(start, start + size)).to_bytes(rows)
+
+
+class BinaryMatrix(_Matrix):
+	"""A taxa x columns 0/1/? matrix stored as bit-packed value and missing planes.
+
+	Selecting columns does not copy the planes: columns maps every column of the matrix to its column in the planes
+	(None for all of them, in order) and the planes are only unpacked, and gathered, when cells are read.
+	"""
+
+	def __init__(self, values, missing, sites, columns=None, width=None, taxa=None):
+		self.values = values
+		self.missing = missing
+		self.sites = sites
+		self.columns = columns
+		self.width = len(sites) if width is None else width	#Number of columns in the packed planes.
+		self.taxa = taxa	#Taxon names of the rows, if known.
+
+	@classmethod
+	def from_masks(cls, values, missing, sites):
+		"""Build a matrix from boolean taxa x columns value and missing masks."""
+		return cls(np.packbits(values, axis=1), np.packbits(missing, axis=1), np.asarray(sites))
+
+	@property
+	def n_taxa(self):
+		return self.values.shape[0]
+
+	@property
+	def n_columns(self):
+		return len(self.sites)
+
+	def _planes(self, rows):
+		#Unpack the rows of the planes, only the bytes spanning the matrix's columns, and return them with the columns
+		#of the matrix in them (None for all, in order).
+		columns, first, count = self.columns, 0, self.width
+		if columns is not None:
+			first = columns.min() // 8 * 8 if len(columns) else 0
+			count = columns.max() + 1 - first if len(columns) else 0
+			columns = columns - first
+		span = slice(first // 8, (first + count + 7) // 8)
+		values = np.unpackbits(self.values[..., span][rows], axis=-1, count=count).view(bool)
+		missing = np.unpackbits(self.missing[..., span][rows], axis=-1, count=count).view(bool)
+		return values, missing, columns
+
+	def unpack(self, rows=slice(None)):
+		"""Return the boolean (values, missing) masks of the given rows."""
+		values, missing, columns = self._planes(rows)
+		if columns is not None:
+			values, missing = np.take(values, columns, axis=-1), np.take(missing, columns, axis=-1)
+		return values, missing
+
+	def select(self, columns):
+		"""Return the matrix restricted to the given columns (boolean mask or indices), sharing the planes."""
+		planes = np.arange(self.width) if self.columns is None else self.columns
+		return BinaryMatrix(self.values, self.missing, self.sites[columns], planes[columns], self.width, self.taxa)
+
+	def compact(self):
+		"""Return the matrix with planes holding exactly its own columns, in order."""
+		return self if self.columns is None else _Matrix.compact(self)
+
+	def with_taxa(self, taxa):
+		"""Return the matrix with one row per taxon of taxa, in that order; rows of taxa it lacks are all ?."""
+		index = dict((taxon, row) for row, taxon in enumerate(self.taxa))
+		present = np.array([taxon in index for taxon in taxa], dtype=bool)
+		rows = [index[taxon] for taxon in taxa if taxon in index]
+		values = np.zeros((len(taxa), self.values.shape[1]), dtype=np.uint8)
+		missing = np.full_like(values, 0xFF)
+		values[present] = self.values[rows]
+		missing[present] = self.missing[rows]
+		return BinaryMatrix(values, missing, self.sites, self.columns, self.width, list(taxa))
+
+	def polarized(self, outgroup):
+		"""Return the matrix polarized against the outgroup row: 0 where a cell matches it, 1 otherwise, ? if either is ?."""
+		values = self.values ^ self.values[outgroup]
+		missing = self.missing | self.missing[outgroup]
+		return BinaryMatrix(values, missing, self.sites, self.columns, self.width, self.taxa)
+
+	def to_bytes(self, rows=slice(None)):
+		"""Return the '0', '1' and '?' characters of the given rows as a uint8 array."""
+		values, missing, columns = self._planes(rows)
+		text = values.astype(np.uint8)
+		text += _ZERO
+		text[missing] = _MISSING
+		if columns is not None:
+			text = np.take(text, columns, axis=-1)
+		return text
+
+
+class OneHotMatrix(_Matrix):
+	"""A taxa x columns 0/1/? one-hot matrix computed from an integer-coded alignment as its cells are read.
+
+	data is the taxa x n uint8 alignment (or its site patterns) with every ambiguous character recoded as missing_code
+	(None if there are none). Binary column i is 1 where data[:, columns[i]] is codes[i], ? where it is missing_code
+	and 0 elsewhere; sites[i] is its input site (by default columns[i]). A polarized matrix flips the columns where
+	flip is set and makes the cells of columns where forced is set ?: the outgroup's value and missing cells.
+	"""
+
+	def __init__(self, data, missing_code, columns, codes, sites=None, flip=None, forced=None, taxa=None):
+		self.data = data
+		self.missing_code = missing_code
+		self.columns = columns
+		self.codes = codes
+		self.sites = columns if sites is None else sites
+		self.flip = flip
+		self.forced = forced
+		self.taxa = taxa
+
+	@property
+	def n_taxa(self):
+		return self.data.shape[0]
+
+	@property
+	def n_columns(self):
+		return len(self.sites)
+
+	def unpack(self, rows=slice(None)):
+		"""Return the boolean (values, missing) masks of the given rows."""
+		cells = self.data[rows].take(self.columns, axis=-1)
+		values = cells == self.codes
+		missing = cells == self.missing_code if self.missing_code is not None else np.zeros_like(values)
+		if self.flip is not None:
+			values ^= self.flip
+			missing |= self.forced
+		return values, missing
+
+	def select(self, columns):
+		"""Return the matrix restricted to the given columns (boolean mask, indices or slice), sharing the data."""
+		polarized = self.flip is not None
+		return OneHotMatrix(self.data, self.missing_code, self.columns[columns], self.codes[columns], self.sites[columns],
+			self.flip[columns] if polarized else None, self.forced[columns] if polarized else None, self.taxa)
+
+	def polarized(self, outgroup):
+		"""Return the matrix polarized against the outgroup row (see BinaryMatrix.polarized()), still uncomputed."""
+		values, missing = self.unpack(outgroup)
+		if self.flip is not None:
+			values ^= self.flip		#A polarized matrix polarized again only keeps the ? of both outgroups.
+		return OneHotMatrix(self.data, self.missing_code, self.columns, self.codes, self.sites, values, missing, self.taxa)
+
+	def with_taxa(self, taxa):
+		"""Return the matrix with one row per taxon of taxa, in that order; rows of taxa it lacks are all ?."""
+		return self.compact().with_taxa(taxa)
+
+	def to_bytes(self, rows=slice(None)):
+		"""Return the '0', '1' and '?' characters of the given rows as a uint8 array."""
+		values, missing = self.unpack(rows)
+		text = values.astype(np.uint8)
+		text += _ZERO
+		text[missing] = _MISSING
+		return text
+
+
+def save_npz(path, matrix, taxa=None):
+	"""Write the packed matrix and its taxon names (by default matrix.taxa) to an uncompressed .npz archive."""
+	if taxa is None:
+		taxa = matrix.taxa
+	matrix = matrix.compact()
+	detach(path)
+	np.savez(path, values=matrix.values, missing=matrix.missing, sites=matrix.sites, taxa=np.array(taxa, dtype=str))
+
+
+def load_npz(path, mmap=True):
+	"""Load a matrix written by save_npz(), returning (taxa, matrix).
+
+	With mmap the packed planes are memory-mapped read-only from the archive rather than read into memory.
+	"""
+	arrays = load_arrays(path, mmap)
+	taxa = [str(taxon) for taxon in arrays["taxa"]]
+	return taxa, BinaryMatrix(arrays["values"], arrays["missing"], arrays["sites"], taxa=taxa)
+
+
+def load_arrays(path, mmap=True):
+	"""Return the {name: array} members of an uncompressed .npz archive, memory-mapped read-only with mmap."""
+	if not mmap:
+		with np.load(path) as archive:
+			return dict(archive)
+
+	arrays = {}
+	with zipfile.ZipFile(path) as archive, open(path, "rb") as handle:
+		for info in archive.infolist():
+			if info.compress_type != zipfile.ZIP_STORED:
+				raise ValueError("%s: member %s is compressed and cannot be memory-mapped" % (path, info.filename))
+			#Skip the local file header (30 bytes, then the file name and extra field) to reach the .npy data.
+			handle.seek(info.header_offset + 26)
+			name_len, extra_len = struct.unpack("<HH", handle.read(4))
+			handle.seek(info.header_offset + 30 + name_len + extra_len)
+			version = np.lib.format.read_magic(handle)
+			if version == (1, 0):
+				shape, fortran, dtype = np.lib.format.read_array_header_1_0(handle)
+			else:
+				shape, fortran, dtype = np.lib.format.read_array_header_2_0(handle)
+			name = info.filename[:-4]
+			if 0 in shape:		#Empty arrays cannot be mapped.
+				arrays[name] = np.empty(shape, dtype=dtype)
+			else:
+				arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=handle.tell(), shape=shape,
+					order="F" if fortran else "C")
+	return arrays
+
+
+def hstack(matrices, offsets=None, joined=None):
+	"""Join matrices side by side, adding offsets[i] to the sites of the i-th matrix (for blocks of an alignment).
+
+	OneHotMatrix objects are joined into a OneHotMatrix over their data side by side, other matrices are packed.
+	Passing the same joined dictionary to the hstack() of several matrices built from the same blocks of data joins
+	the data only once.
+	"""
+	if offsets is None:
+		offsets = [0] * len(matrices)
+	sites = np.concatenate([matrix.sites + offset for matrix, offset in zip(matrices, offsets)])
+	if all(isinstance(matrix, OneHotMatrix) for matrix in matrices):
+		return _hstack_one_hot(matrices, sites, {} if joined is None else joined)
+	n_taxa = matrices[0].n_taxa
+	values = np.empty((n_taxa, (len(sites) + 7) // 8), dtype=np.uint8)
+	missing = np.empty_like(values)
+	for start in range(0, n_taxa, _ROW_BLOCK):
+		block = slice(start, start + _ROW_BLOCK)
+		unpacked = [matrix.unpack(block) for matrix in matrices]
+		values[block] = np.packbits(np.concatenate([part[0] for part in unpacked], axis=1), axis=1)
+		missing[block] = np.packbits(np.concatenate([part[1] for part in unpacked], axis=1), axis=1)
+	return BinaryMatrix(values, missing, sites, taxa=matrices[0].taxa)
+
+
+def _hstack_one_hot(matrices, sites, joined):
+	starts = np.cumsum([0] + [matrix.data.shape[1] for matrix in matrices[:-1]])
+	columns = np.concatenate([matrix.columns + start for matrix, start in zip(matrices, starts)])
+	codes = np.concatenate([matrix.codes for matrix in matrices])
+	flip, forced = None, None
+	if any(matrix.flip is not None for matrix in matrices):
+		unflipped = lambda matrix: np.zeros(matrix.n_columns, dtype=bool)
+		flip = np.concatenate([unflipped(matrix) if matrix.flip is None else matrix.flip for matrix in matrices])
+		forced = np.concatenate([unflipped(matrix) if matrix.forced is None else matrix.forced for matrix in matrices])
+	key = tuple(id(matrix.data) for matrix in matrices)
+	if key not in joined:
+		joined[key] = np.concatenate([matrix.data for matrix in matrices], axis=1)
+	data = joined[key]
+	return OneHotMatrix(data, matrices[0].missing_code, columns, codes, sites, flip, forced, matrices[0].taxa)
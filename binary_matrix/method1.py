@@ -0,0 +1,456 @@
+########################################################################################################################
+#
+#  method1.py
+#
+#  The work of make_binary_matrix_Method_1.py: read the alignment once, build the four binary matrices (all, reduced,
+#	polarized, polarized reduced) and write each as phylip and csv. A selection of outputs (parse_outputs()) builds
+#	only the matrices it needs and writes only the formats asked for. Progress messages go to the log callable, so
+#	the script passes print and a pipeline running many alignments in one process can pass nothing.
+#
+#  A Resampling (see resample.py) also writes bootstrap or jackknife replicates of every output matrix, drawn from
+#	the matrices in memory. A distance metric (see distance.py) also writes the pairwise distances between the taxa
+#	of every output matrix. Runs recoded window by window can be checkpointed and resumed (see checkpoint.py).
+#
+########################################################################################################################
+
+import os
+import zipfile
+
+import numpy as np
+
+from binary_matrix import engine
+from binary_matrix.alignment import PHYLIP_HEADER, parse_alignment
+from binary_matrix.cache import cached_run
+from binary_matrix.checkpoint import Checkpoint
+from binary_matrix.distance import METRICS, distances, pair_counts, write_distances
+from binary_matrix.matrix import OneHotMatrix, hstack, load_arrays, save_npz
+from binary_matrix.parallel import map_windows
+from binary_matrix.resample import REPLICATE_FORMATS, column_weights, write_replicates, write_weights
+from binary_matrix.stats import Stats
+from binary_matrix.stream import MappedAlignment, window_size
+from binary_matrix.util import quiet
+from binary_matrix.writers import MatrixFileWriter, csv_cells, write_matrix
+
+#File formats an output can be written in.
+FORMATS = ["phy", "csv", "npz"]
+
+#Name suffix of the per-site index of the alignment that --append extends.
+INDEX = ".binary.index.npz"
+
+
+def parse_outputs(selectors=None, npz=False):
+	"""Return {matrix: [formats]} of a list of output selectors.
+
+	A selector is a matrix (engine.MATRICES), written as phy and csv, or a matrix and a format, e.g.
+	"polarized.reduced.phy". No selectors select every matrix; npz adds the npz format to every selected matrix.
+	"""
+	outputs = {}
+	for selector in engine.MATRICES if selectors is None else selectors:
+		matrix, dot, fmt = selector.rpartition(".")
+		if selector in engine.MATRICES:
+			matrix, formats = selector, ["phy", "csv"]
+		elif matrix in engine.MATRICES and fmt in FORMATS:
+			formats = [fmt]
+		else:
+			raise ValueError("Output %s is not a matrix (%s) optionally followed by a format (%s)." % (selector,
+				", ".join(engine.MATRICES), ", ".join(FORMATS)))
+		outputs.setdefault(matrix, [])
+		outputs[matrix].extend(fmt for fmt in formats if fmt not in outputs[matrix])
+	if npz:
+		for formats in outputs.values():
+			if "npz" not in formats:
+				formats.append("npz")
+	return outputs
+
+
+def output_files(out_file, outgroups, matrices=engine.MATRICES):
+	"""Return the (file name without extension, matrix, outgroup) of the matrices engine.recode_block() returns.
+
+	outgroup is None for the unpolarized matrices. With several outgroups the polarized matrices of each are told
+	apart by the outgroup name at the end.
+	"""
+	files = [(out_file + ".binary." + matrix, matrix, None) for matrix in ("all", "reduced") if matrix in matrices]
+	for outgroup in outgroups:
+		tag = "." + outgroup if len(outgroups) > 1 else ""
+		files += [(out_file + ".binary." + matrix + tag, matrix, outgroup) for matrix in ("polarized", "polarized.reduced")
+			if matrix in matrices]
+	return files
+
+
+def recode(alignment, ambiguous, outgroups, window=None, n_jobs=1, stats=None, matrices=engine.MATRICES):
+	"""Return the binary matrices of an in-memory Alignment (see engine.recode_block()), recoded in blocks by n_jobs
+	processes if n_jobs > 1. window is the number of sites of a block, by default sized from the number of taxa (see
+	stream.window_size()).
+	"""
+	stats = Stats() if stats is None else stats
+	window = window_size(alignment.n_taxa, window)
+	if n_jobs > 1:	#The encoded matrix is shared with the workers, not copied.
+		with stats.stage("recode"):
+			starts, blocks = zip(*map_windows(engine.recode_block, alignment.data, n_jobs, window, (ambiguous, outgroups, matrices)))
+			joined = {}
+			recoded = [hstack(block, starts, joined) for block in zip(*blocks)]
+	else:
+		recoded = engine.recode_block(alignment.data, ambiguous, outgroups, matrices, stats)
+	for binary in recoded:
+		binary.taxa = alignment.taxa
+	return recoded
+
+
+def run(in_file, out_file, ambig_chars, outgroup=None, npz=False, stream=False, window=None, n_jobs=1, log=quiet,
+		stats=None, outputs=None, cache=None, index=False, append=False, compress=None, resampling=None,
+		distance=None, checkpoint=None, resume=False):
+	"""Write the Method 1 outputs of in_file to the output_files() + ".phy"/".csv" (and ".npz" with npz).
+
+	outgroup is a taxon or a list of taxa to polarize against, by default the last taxon of the file. outputs is a
+	list of output selectors (see parse_outputs()), by default every matrix as phy and csv. With stream the input is
+	memory-mapped and recoded window by window instead of being read into memory, window sites at a time (by default
+	sized from the number of taxa, see stream.window_size()). stats is a stats.Stats object recording the stages and
+	column counts. With a cache.ResultCache the outputs are restored from it if the same
+	input was recoded with the same options before. compress ("gz", "bz2" or "xz") compresses the phy and csv
+	outputs, which get its suffix, with n_jobs threads.
+
+	With a resample.Resampling, its replicates of every output matrix are also written to replicate_file(), drawn by
+	n_jobs threads. Without a seed one is drawn, logged, and the outputs are not cached. With a distance metric
+	("hamming" or "jaccard") the PHYLIP distance matrix of every output matrix is written to distance_file().
+
+	With stream, checkpoint is a directory the progress of the run is saved to after every window (see
+	checkpoint.Checkpoint); with resume a run stopped part way carries on from its last checkpoint there. Checkpointed
+	runs are not cached.
+
+	index also saves the per-site index of the alignment as out_file + INDEX. With append, in_file holds taxa to add
+	to the alignment indexed at out_file: only their rows are searched for new states and the outputs and index are
+	rewritten with them, polarized against the indexed outgroups unless outgroup is given.
+
+	Raises ValueError for sequences of different lengths or an unknown output and KeyError for an unknown outgroup.
+	"""
+	outputs = parse_outputs(outputs, npz)
+	if stream and any("npz" in formats for formats in outputs.values()):
+		raise ValueError("--npz needs the whole matrix in memory and cannot be used with --stream.")
+	if stream and (index or append):
+		raise ValueError("--index and --append need the whole alignment in memory and cannot be used with --stream.")
+	if stream and resampling is not None:
+		raise ValueError("Replicates are drawn from the whole matrix in memory and cannot be used with --stream.")
+	if checkpoint is not None and not stream:
+		raise ValueError("--checkpoint saves the progress of runs recoded window by window and needs --stream.")
+	if resume and checkpoint is None:
+		raise ValueError("--resume needs the --checkpoint directory of the run to resume.")
+	if distance is not None and distance not in METRICS:
+		raise ValueError("Distance metric %s is not one of %s." % (distance, ", ".join(METRICS)))
+	if resampling is not None and resampling.format not in REPLICATE_FORMATS:
+		raise ValueError("Replicate format %s is not one of %s." % (resampling.format, ", ".join(REPLICATE_FORMATS)))
+	if resampling is not None and resampling.seed is None:
+		resampling = resampling._replace(seed=np.random.SeedSequence().entropy)
+		log("Replicates are drawn with seed %d." % (resampling.seed,))
+		cache = None
+	stats = Stats() if stats is None else stats
+	outgroups = None if outgroup is None else [outgroup] if isinstance(outgroup, str) else list(outgroup)
+	matrices = [matrix for matrix in engine.MATRICES if matrix in outputs]
+	if append:		#The outputs depend on the indexed alignment too, so they are not cached.
+		return _run_append(in_file, out_file, ambig_chars, outgroups, outputs, matrices, n_jobs, log, stats, compress,
+			resampling, distance)
+
+	files = output_files(out_file, outgroups or [None], matrices)
+	paths = [_path(name, fmt, compress) for name, matrix, taxon in files for fmt in FORMATS if fmt in outputs[matrix]]
+	if resampling is not None:
+		paths += [replicate_file(name, resampling, compress) for name, matrix, taxon in files]
+	if distance is not None:
+		paths += [distance_file(name, distance, compress) for name, matrix, taxon in files]
+	if index:
+		paths.append(out_file + INDEX)
+	options = dict(method=1, ambig_chars=_ambig_key(ambig_chars), outgroups=outgroups,
+		outputs=dict((matrix, sorted(formats)) for matrix, formats in outputs.items()), index=index, compress=compress,
+		resampling=resampling and resampling._asdict(), distance=distance)
+	if checkpoint is not None:
+		checkpoint = Checkpoint(checkpoint, in_file, options, paths, resume)
+		cache = None
+	cached_run(cache, in_file, options, paths, log, stats, lambda log: _run(in_file, out_file, ambig_chars, outgroups,
+		outputs, matrices, stream, window, n_jobs, log, stats, index, compress, resampling, distance, checkpoint))
+
+
+def replicate_file(name, resampling, compress=None):
+	"""Return the file of the replicates of the output matrix name (see output_files()), e.g.
+	out.binary.reduced.bootstrap.weights or out.binary.reduced.jackknife.phy.
+	"""
+	return _path("%s.%s" % (name, resampling.method), resampling.format, compress)
+
+
+def distance_file(name, metric, compress=None):
+	"""Return the file of the distance matrix of the output matrix name, e.g. out.binary.reduced.hamming.dist."""
+	return _path("%s.%s" % (name, metric), "dist", compress)
+
+
+def save_index(path, binary, names, ambig_chars, outgroups):
+	"""Save a per-site index: the site-indexed OneHotMatrix of an alignment (see engine.extend()), its state codes
+	and sites per binary column, the names of the output lines, the ambiguous characters and the outgroups.
+
+	The index holds the whole alignment, so it is a deflated .npz archive (at the fastest level, under half the size of
+	the alignment). It is written next to path and renamed over it, so a run stopped while saving it leaves
+	the previous index as it was.
+	"""
+	missing_code = -1 if binary.missing_code is None else binary.missing_code
+	arrays = dict(data=binary.data, codes=binary.codes, sites=binary.sites, taxa=np.array(binary.taxa, dtype=str),
+		names=np.array(names, dtype=str), ambig_chars=np.array(_ambig_key(ambig_chars)),
+		outgroups=np.array(outgroups, dtype=str), missing_code=np.array(missing_code))
+	with open(path + ".tmp", "wb") as OUT:
+		with zipfile.ZipFile(OUT, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+			for name, array in arrays.items():
+				with archive.open(name + ".npy", "w", force_zip64=True) as MEMBER:
+					np.lib.format.write_array(MEMBER, np.asarray(array))
+		OUT.flush()
+		os.fsync(OUT.fileno())
+	os.replace(path + ".tmp", path)
+
+
+def load_index(path):
+	"""Return the (binary, names, ambig_chars, outgroups) of an index saved by save_index()."""
+	arrays = load_arrays(path, mmap=False)
+	missing_code = int(arrays["missing_code"])
+	binary = OneHotMatrix(arrays["data"], None if missing_code < 0 else missing_code, arrays["sites"], arrays["codes"],
+		taxa=[str(taxon) for taxon in arrays["taxa"]])
+	names = [str(name) for name in arrays["names"]]
+	return binary, names, str(arrays["ambig_chars"]), [str(taxon) for taxon in arrays["outgroups"]]
+
+
+def _path(name, fmt, compress):
+	#Name of an output file; only the text formats are compressed.
+	return "%s.%s" % (name, fmt) + ("." + compress if compress and fmt != "npz" else "")
+
+
+def _ambig_key(ambig_chars):
+	return "".join(sorted(set(ambig_chars)))
+
+
+def _log_outgroups(log, outgroups):
+	if len(outgroups) == 1:
+		log("The outgroup taxon is %s." % (outgroups[0],))
+	else:
+		log("The outgroup taxa are %s." % (", ".join(outgroups),))
+
+
+def _run(in_file, out_file, ambig_chars, outgroups, outputs, matrices, stream, window, n_jobs, log, stats, index,
+		compress, resampling, distance, checkpoint=None):
+	with stats.stage("index" if stream else "parse"):
+		alignment = MappedAlignment(in_file, header=PHYLIP_HEADER) if stream else parse_alignment(in_file)
+	stats.count(taxa=len(alignment.taxa), sites=alignment.n_sites)
+	window = window_size(len(alignment.taxa), window)
+	try:
+		if alignment.format != "text":
+			log("Input file detected as %s format." % (alignment.format,))
+		log("All input character sets should be %s characters long." % (alignment.n_sites,))
+		if outgroups is None:
+			outgroups = [alignment.last_taxon]
+		_log_outgroups(log, outgroups)
+		out_rows = [alignment.row(taxon) for taxon in outgroups]
+		ambiguous = engine.ambiguity_table(ambig_chars)
+
+		#Output lines are written in the order of the input file.
+		rows = [alignment.row(name) for name in alignment.names]
+		files = output_files(out_file, outgroups, matrices)
+		if stream:
+			if checkpoint is not None and checkpoint.resumed:
+				log("Resuming at character %d from the checkpoint in %s." % (checkpoint.position + 1, checkpoint.directory))
+			n_columns = _run_stream(alignment, files, outputs, ambiguous, out_rows, rows, window, n_jobs, stats, compress,
+				distance, checkpoint)
+		else:
+			build = ["all"] + matrices if index and "all" not in matrices else matrices
+			recoded = recode(alignment, ambiguous, out_rows, window, n_jobs, stats, build)
+			if index:
+				binary = recoded[0] if build is matrices else recoded.pop(0)
+				with stats.stage("save_index"):
+					data, missing_code = engine.collapse_ambiguous(alignment.data, ambiguous)
+					indexed = OneHotMatrix(data, missing_code, binary.sites, binary.codes, taxa=alignment.taxa)
+					save_index(out_file + INDEX, indexed, alignment.names, ambig_chars, outgroups)
+			n_columns = write_outputs(files, outputs, recoded, alignment.names, rows, n_jobs, stats, compress)
+			if resampling is not None:
+				_resample(files, recoded, alignment.names, rows, alignment.n_sites, resampling, n_jobs, stats, compress)
+			if distance is not None:
+				counts = (pair_counts(binary, distance, n_jobs) for binary in recoded)
+				_write_distances(files, counts, alignment.names, rows, distance, n_jobs, stats, compress)
+		count_columns(stats, outgroups, files, n_columns)
+	finally:
+		if stream:
+			alignment.close()
+	log("\nFinished\n")
+
+
+def _run_append(in_file, out_file, ambig_chars, outgroups, outputs, matrices, n_jobs, log, stats, compress,
+		resampling, distance):
+	index_file = out_file + INDEX
+	if not os.path.exists(index_file):
+		raise ValueError("%s does not exist, the alignment to append to must be recoded with --index first." % (index_file,))
+	with stats.stage("load_index"):
+		indexed, names, indexed_ambig, indexed_outgroups = load_index(index_file)
+	if indexed_ambig != _ambig_key(ambig_chars):
+		raise ValueError("%s was built with the ambiguous characters %s, not %s." % (index_file, indexed_ambig,
+			_ambig_key(ambig_chars)))
+	with stats.stage("parse"):
+		alignment = parse_alignment(in_file)
+	stats.count(taxa=len(alignment.taxa), sites=alignment.n_sites)
+	if alignment.format != "text":
+		log("Input file detected as %s format." % (alignment.format,))
+	if alignment.n_sites != indexed.data.shape[1]:
+		raise ValueError("Error, %s has %d characters, the alignment indexed in %s has %d." % (in_file, alignment.n_sites,
+			index_file, indexed.data.shape[1]))
+	for taxon in alignment.taxa:
+		if taxon in indexed.taxa:
+			raise ValueError("Taxon %s is already in %s." % (taxon, index_file))
+	log("Adding %d taxa to the %d taxa indexed in %s." % (len(alignment.taxa), indexed.n_taxa, index_file))
+	with stats.stage("extend"):
+		binary = engine.extend(indexed, alignment.data, engine.ambiguity_table(ambig_chars), alignment.taxa)
+	stats.count(new_columns=binary.n_columns - indexed.n_columns)
+
+	outgroups = indexed_outgroups if outgroups is None else outgroups
+	_log_outgroups(log, outgroups)
+	row = dict((taxon, row) for row, taxon in enumerate(binary.taxa))
+	for taxon in outgroups:
+		if taxon not in row:
+			raise KeyError("Taxon %s is not in the alignment." % (taxon,))
+	names = names + alignment.names
+	files = output_files(out_file, outgroups, matrices)
+	recoded = engine.derive(binary, [row[taxon] for taxon in outgroups], matrices, stats)
+	rows = [row[name] for name in names]
+	n_columns = write_outputs(files, outputs, recoded, names, rows, n_jobs, stats, compress)
+	if resampling is not None:
+		_resample(files, recoded, names, rows, alignment.n_sites, resampling, n_jobs, stats, compress)
+	if distance is not None:
+		counts = (pair_counts(binary, distance, n_jobs) for binary in recoded)
+		_write_distances(files, counts, names, rows, distance, n_jobs, stats, compress)
+	with stats.stage("save_index"):
+		save_index(index_file, binary, names, ambig_chars, outgroups)
+	count_columns(stats, outgroups, files, n_columns)
+	log("\nFinished\n")
+
+
+def write_outputs(files, outputs, recoded, names, rows, n_jobs=1, stats=None, compress=None):
+	"""Write the recoded matrices of the output_files() files in the formats of outputs (see parse_outputs()), with
+	n_jobs threads filling (or compressing) each file, and return their column counts.
+
+	names are the taxa of the output lines and rows the matrix row written on each of them.
+	"""
+	stats = Stats() if stats is None else stats
+	with stats.stage("write"):
+		for (name, matrix, taxon), binary in zip(files, recoded):
+			if "npz" in outputs[matrix]:	#Bit-packed copies that can be memory-mapped without re-parsing the text.
+				save_npz(name + ".npz", binary)
+			if "phy" in outputs[matrix]:
+				write_matrix(_path(name, "phy", compress), binary, names, rows, n_taxa=binary.n_taxa, n_jobs=n_jobs,
+					compress=compress)
+			if "csv" in outputs[matrix]:
+				write_matrix(_path(name, "csv", compress), binary, names, rows, csv=True, n_jobs=n_jobs, compress=compress)
+	return [binary.n_columns for binary in recoded]
+
+
+def _resample(files, recoded, names, rows, n_sites, resampling, n_jobs, stats, compress):
+	#Write the replicates of every recoded matrix. Replicates over sites draw the same sites for every matrix.
+	with stats.stage("resample"):
+		for (name, matrix, taxon), binary in zip(files, recoded):
+			weights = column_weights(binary, resampling, n_sites, n_jobs)
+			if resampling.format == "phy":
+				write_replicates(replicate_file(name, resampling, compress), binary, names, rows, weights, n_jobs, compress)
+			else:
+				write_weights(replicate_file(name, resampling, compress), weights, n_jobs, compress)
+	stats.count(replicates=resampling.n_replicates)
+
+
+def _write_distances(files, counts, names, rows, metric, n_jobs, stats, compress):
+	#Write the distance matrix of every matrix from its pair counts, which may be counted as they are iterated over.
+	with stats.stage("distances"):
+		for (name, matrix, taxon), matrix_counts in zip(files, counts):
+			write_distances(distance_file(name, metric, compress), distances(matrix_counts), names, rows, n_jobs, compress)
+
+
+def count_columns(stats, outgroups, files, n_columns):
+	"""Record in stats the column counts of the matrices of files that were built. The invariant and skipped columns
+	are the difference of two of them and are only counted when both were.
+	"""
+	columns = dict(((matrix, taxon), count) for (name, matrix, taxon), count in zip(files, n_columns))
+	n_all, n_reduced = columns.get(("all", None)), columns.get(("reduced", None))
+	if n_all is not None:
+		stats.count(binary_columns=n_all)
+	if n_reduced is not None:
+		stats.count(reduced_columns=n_reduced)
+	if n_all is not None and n_reduced is not None:
+		stats.count(invariant_columns=n_all - n_reduced)
+	for taxon in outgroups:
+		tag = "." + taxon if len(outgroups) > 1 else ""
+		n_polarized_reduced = columns.get(("polarized.reduced", taxon))
+		if n_polarized_reduced is not None:
+			stats.count(**{"polarized_reduced_columns" + tag: n_polarized_reduced})
+			if n_reduced is not None:
+				stats.count(**{"skipped_columns" + tag: n_reduced - n_polarized_reduced})
+
+
+def _run_stream(alignment, files, outputs, ambiguous, out_rows, rows, window, n_jobs, stats, compress, distance,
+		checkpoint=None):
+	#A first pass only counts the binary columns, so every output file can be laid out up front and each window's
+	#columns written straight to their place in it. Distance counts add up over columns, so they are counted window
+	#by window too. With a checkpoint.Checkpoint the progress is saved after every window, and a resumed run skips
+	#the first pass and the windows already written. Returns the column counts of the matrices.
+	resumed = checkpoint is not None and checkpoint.resumed
+	if resumed:
+		n_columns = checkpoint.state["columns"]
+	else:
+		counts = np.zeros(2 + len(out_rows), dtype=np.int64)
+		with stats.stage("count"):
+			for start, window_counts in map_windows(engine.column_counts, alignment, n_jobs, window, (ambiguous, out_rows)):
+				counts += window_counts
+		#recode_block() polarizes against out_rows in order, so the polarized reduced counts follow the outgroups of files.
+		n_polarized_reduced = iter(counts[2:])
+		columns = {"all": counts[0], "reduced": counts[1], "polarized": counts[0]}
+		n_columns = [int(next(n_polarized_reduced) if matrix == "polarized.reduced" else columns[matrix])
+			for name, matrix, taxon in files]
+	writers = []
+	for i, (name, matrix, taxon) in enumerate(files):
+		filled = checkpoint.state["filled"][i] if resumed else (None, None)
+		OUT_PHY, OUT_CSV = None, None
+		if "phy" in outputs[matrix]:
+			OUT_PHY = MatrixFileWriter(_path(name, "phy", compress), alignment.names, rows, n_columns[i],
+				n_taxa=len(alignment.taxa), threads=n_jobs, filled=filled[0], compress=compress)
+		if "csv" in outputs[matrix]:
+			OUT_CSV = MatrixFileWriter(_path(name, "csv", compress), alignment.names, rows, n_columns[i], cell_width=2,
+				threads=n_jobs, filled=filled[1], compress=compress)
+		writers.append((OUT_PHY, OUT_CSV))
+
+	matrices = [matrix for matrix in engine.MATRICES if matrix in outputs]
+	n_taxa = len(alignment.taxa)
+	counts = None
+	if distance is not None and resumed:
+		counts = [(checkpoint.arrays["differences%d" % i], checkpoint.arrays["compared%d" % i]) for i in range(len(files))]
+	elif distance is not None:
+		counts = [(np.zeros((n_taxa, n_taxa), dtype=np.int64), np.zeros((n_taxa, n_taxa), dtype=np.int64))
+			for file in files]
+
+	def save(position):
+		state = dict(columns=n_columns, filled=[[None if OUT is None else OUT.filled for OUT in OUTS] for OUTS in writers])
+		arrays = {}
+		for i, (differences, compared) in enumerate(counts or []):
+			arrays["differences%d" % i], arrays["compared%d" % i] = differences, compared
+		checkpoint.save(position, state, [OUT for OUTS in writers for OUT in OUTS if OUT is not None], arrays)
+
+	if checkpoint is not None and not resumed:
+		save(0)
+	first = checkpoint.position if checkpoint is not None else 0
+	with stats.stage("recode_write"):
+		for start, recoded in map_windows(engine.recode_block, alignment, n_jobs, window, (ambiguous, out_rows, matrices),
+				first):
+			if distance is not None:
+				for binary, matrix_counts in zip(recoded, counts):
+					pair_counts(binary, distance, n_jobs, matrix_counts)
+			for binary, (OUT_PHY, OUT_CSV) in zip(recoded, writers):
+				text = binary.to_bytes()
+				if OUT_PHY is not None:
+					OUT_PHY.write(text)
+				if OUT_CSV is not None:
+					OUT_CSV.write(csv_cells(text))
+			if checkpoint is not None:
+				save(min(start + window, alignment.n_sites))
+
+		for OUT in writers:
+			for OUT_FILE in OUT:
+				if OUT_FILE is not None:
+					OUT_FILE.close()
+	if distance is not None:
+		_write_distances(files, counts, alignment.names, rows, distance, n_jobs, stats, compress)
+	if checkpoint is not None:
+		checkpoint.remove()
+	return n_columns
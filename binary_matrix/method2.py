@@ -0,0 +1,187 @@
+########################################################################################################################
+#
+#  method2.py
+#
+#  The work of make_binary_matrix_Method_2.py: read the DNA alignment once, recode it relative to the outgroup (see
+#	uib.py) and write the recoded sequence, binary, binary csv and UIB matrices. Progress messages go to the log
+#	callable, with one more line per site from verbosity 1. Runs recoded window by window can be checkpointed and
+#	resumed (see checkpoint.py).
+#
+########################################################################################################################
+
+import numpy as np
+
+from binary_matrix import uib
+from binary_matrix.alignment import parse_alignment
+from binary_matrix.cache import cached_run
+from binary_matrix.checkpoint import Checkpoint
+from binary_matrix.parallel import map_windows
+from binary_matrix.stats import Stats
+from binary_matrix.stream import MappedAlignment, window_size
+from binary_matrix.util import quiet
+from binary_matrix.writers import MatrixFileWriter, csv_cells, write_matrix
+
+
+def output_files(out_file, compress=None):
+	"""Return the (sequence, binary, binary csv, UIB) output file names, with the suffix of the compress compression."""
+	suffix = "." + compress if compress else ""
+	return tuple(name + suffix for name in (out_file, "binary." + out_file, "binary." + out_file + ".csv", "uib." + out_file))
+
+
+def recode(alignment, outgroup, window=None, n_jobs=1, log=quiet, verbosity=0):
+	"""Return the UIBMatrices of an in-memory Alignment, recoded in blocks by n_jobs processes if n_jobs > 1.
+
+	window is the number of sites of a block, by default sized from the number of taxa (see stream.window_size()).
+	With verbosity 1 the bases of every site are logged.
+	"""
+	window = window_size(alignment.n_taxa, window)
+	seq_blocks, bin_blocks, uib_blocks, bases = [], [], [], []
+	for start, (seq, binary, uib_block, block_bases) in map_windows(uib.recode_block, alignment.data, n_jobs, window, (outgroup,)):
+		if verbosity >= 1:
+			log_bases(log, start, block_bases)
+		seq_blocks.append(seq)
+		bin_blocks.append(binary)
+		uib_blocks.append(uib_block)
+		bases.append(block_bases)
+	stack = lambda blocks: np.hstack(blocks) if blocks else np.empty((alignment.n_taxa, 0), dtype=np.uint8)
+	return uib.UIBMatrices(stack(seq_blocks), stack(bin_blocks), stack(uib_blocks), uib.join_bases(bases))
+
+
+def run(in_file, out_file, outgroup=None, skip_first=True, phylip=True, stream=False, window=None, n_jobs=1, log=quiet,
+		stats=None, cache=None, verbosity=0, compress=None, checkpoint=None, resume=False):
+	"""Write the Method 2 outputs of in_file (see output_files()).
+
+	skip_first skips the first line of the input (a phylip header) and phylip writes phylip headers on the outputs
+	other than the csv. outgroup defaults to the last taxon of the file. With stream the input is memory-mapped and
+	recoded window by window instead of being read into memory, window sites at a time (see method1.run()). stats is a stats.Stats object recording the stages
+	and column counts. With a cache.ResultCache the outputs are restored from it if the same input was recoded with
+	the same options before. With verbosity 1 the outgroup base and the other bases of every site are logged too.
+	compress ("gz", "bz2" or "xz") compresses the outputs, which get its suffix, with n_jobs threads. With stream,
+	checkpoint is a directory the progress is saved to after every window and resume carries on from the last
+	checkpoint there (see method1.run()). Raises ValueError for sequences of different lengths and KeyError for an
+	unknown outgroup.
+	"""
+	if checkpoint is not None and not stream:
+		raise ValueError("--checkpoint saves the progress of runs recoded window by window and needs --stream.")
+	if resume and checkpoint is None:
+		raise ValueError("--resume needs the --checkpoint directory of the run to resume.")
+	stats = Stats() if stats is None else stats
+	options = dict(method=2, outgroup=outgroup, skip_first=skip_first, phylip=phylip, verbosity=min(verbosity, 1),
+		compress=compress)
+	files = output_files(out_file, compress)
+	if checkpoint is not None:
+		checkpoint = Checkpoint(checkpoint, in_file, options, list(files), resume)
+		cache = None
+	cached_run(cache, in_file, options, list(files), log, stats, lambda log: _run(in_file, files, outgroup, skip_first,
+		phylip, stream, window, n_jobs, log, stats, verbosity, compress, checkpoint))
+
+
+def _run(in_file, files, outgroup, skip_first, phylip, stream, window, n_jobs, log, stats, verbosity, compress=None,
+		checkpoint=None):
+	with stats.stage("index" if stream else "parse"):
+		if stream:
+			alignment = MappedAlignment(in_file, skip_first=skip_first)
+		else:
+			alignment = parse_alignment(in_file, header="first" if skip_first else None)
+	stats.count(taxa=len(alignment.taxa), sites=alignment.n_sites)
+	window = window_size(len(alignment.taxa), window)
+	try:
+		log("All input sequences should be %s bases long." % (alignment.n_sites,))
+		if outgroup is None:
+			outgroup = alignment.last_taxon
+		log("The outgroup taxon is %s." % (outgroup,))
+		out_row = alignment.row(outgroup)
+
+		#Output lines are written in the order of the input file.
+		rows = [alignment.row(name) for name in alignment.names]
+		n_taxa = len(alignment.taxa) if phylip else None
+		if stream:
+			if checkpoint is not None and checkpoint.resumed:
+				log("Resuming at base %d from the checkpoint in %s." % (checkpoint.position + 1, checkpoint.directory))
+			_run_stream(alignment, files, out_row, rows, n_taxa, window, n_jobs, log, stats, verbosity, compress,
+				checkpoint)
+		else:
+			with stats.stage("recode"):
+				matrices = recode(alignment, out_row, window, n_jobs, log, verbosity)
+			stats.count(binary_columns=matrices.binary.shape[1], uib_columns=matrices.uib.shape[1],
+				invariant_sites=matrices.bases.invariant())
+			with stats.stage("write"):
+				write_outputs(files, matrices, alignment.names, rows, n_taxa, n_jobs, compress)
+	finally:
+		if stream:
+			alignment.close()
+
+
+def write_outputs(files, matrices, names, rows, n_taxa=None, n_jobs=1, compress=None):
+	"""Write UIBMatrices to the output_files() files, with phylip headers for n_taxa taxa unless n_taxa is None.
+
+	names are the taxa of the output lines and rows the matrix row written on each of them. compress is the
+	compression the files were named for.
+	"""
+	seq_file, bin_file, csv_file, uib_file = files
+	write_matrix(seq_file, matrices.sequence, names, rows, n_taxa=n_taxa, n_jobs=n_jobs, compress=compress)
+	write_matrix(bin_file, matrices.binary, names, rows, n_taxa=n_taxa, n_jobs=n_jobs, compress=compress)
+	write_matrix(uib_file, matrices.uib, names, rows, n_taxa=n_taxa, n_jobs=n_jobs, compress=compress)
+	write_matrix(csv_file, matrices.binary, names, rows, csv=True, separator="", n_jobs=n_jobs,
+		compress=compress)	#CSV file shouldn't have phylip header.
+
+
+def log_bases(log, start, bases):
+	"""Log the outgroup base and the other bases of every site of a window's SiteBases, numbered from start."""
+	for site, out_base, nucs in bases.per_site(start):
+		log("Character %d of outgroup is base %s, other bases are: %s" % (site, chr(out_base), [chr(nuc) for nuc in nucs]))
+
+
+def _run_stream(alignment, files, out_row, rows, n_taxa, window, n_jobs, log, stats, verbosity, compress=None,
+		checkpoint=None):
+	#A first pass only counts the recoded columns, so every output file can be laid out up front and each window's
+	#columns written straight to their place in it. With a checkpoint.Checkpoint the progress is saved after every
+	#window, and a resumed run skips the first pass and the windows already written.
+	resumed = checkpoint is not None and checkpoint.resumed
+	if resumed:
+		n_columns = checkpoint.state["columns"]
+		stats.count(invariant_sites=checkpoint.state["invariant_sites"])
+	else:
+		n_columns = 0
+		with stats.stage("count"):
+			for start, count in map_windows(uib.column_count, alignment, n_jobs, window, (out_row,)):
+				n_columns += count
+	stats.count(binary_columns=n_columns, uib_columns=n_columns + alignment.n_sites)
+
+	seq_file, bin_file, csv_file, uib_file = files
+	filled = checkpoint.state["filled"] if resumed else [None] * 4
+	OUT_SEQ = MatrixFileWriter(seq_file, alignment.names, rows, n_columns, n_taxa=n_taxa, threads=n_jobs, filled=filled[0],
+		compress=compress)
+	OUT_BIN = MatrixFileWriter(bin_file, alignment.names, rows, n_columns, n_taxa=n_taxa, threads=n_jobs, filled=filled[1],
+		compress=compress)
+	OUT_CSV = MatrixFileWriter(csv_file, alignment.names, rows, n_columns, cell_width=2, separator="", threads=n_jobs,
+		filled=filled[2], compress=compress)	#CSV file shouldn't have phylip header.
+	OUT_UIB = MatrixFileWriter(uib_file, alignment.names, rows, n_columns + alignment.n_sites, n_taxa=n_taxa,
+		threads=n_jobs, filled=filled[3], compress=compress)
+	writers = (OUT_SEQ, OUT_BIN, OUT_CSV, OUT_UIB)
+
+	def save(position):
+		state = dict(columns=n_columns, filled=[OUT.filled for OUT in writers],
+			invariant_sites=stats.counts.get("invariant_sites", 0))
+		checkpoint.save(position, state, writers)
+
+	if checkpoint is not None and not resumed:
+		save(0)
+	first = checkpoint.position if checkpoint is not None else 0
+	with stats.stage("recode_write"):
+		for start, (seq, binary, uib_block, bases) in map_windows(uib.recode_block, alignment, n_jobs, window, (out_row,),
+				first):
+			if verbosity >= 1:
+				log_bases(log, start, bases)
+			stats.count(invariant_sites=bases.invariant())
+			OUT_SEQ.write(seq)
+			OUT_BIN.write(binary)
+			OUT_CSV.write(csv_cells(binary))
+			OUT_UIB.write(uib_block)
+			if checkpoint is not None:
+				save(min(start + window, alignment.n_sites))
+
+		for OUT in writers:
+			OUT.close()
+	if checkpoint is not None:
+		checkpoint.remove()
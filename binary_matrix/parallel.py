@@ -0,0 +1,101 @@
+########################################################################################################################
+#
+#  parallel.py
+#
+#  Column block parallelism. Every site is recoded from its own column only, so an alignment can be cut into blocks
+#	of sites that a pool of worker processes recodes independently. Results come back in block order, so the output
+#	is identical to a serial run.
+#
+#  Workers do not receive copies of the alignment with every block: an in-memory alignment is placed in shared memory
+#	(SharedAlignment) and a memory-mapped file (stream.MappedAlignment) is simply mapped again by each worker.
+#
+########################################################################################################################
+
+import collections
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedAlignment(object):
+	"""A taxa x sites uint8 alignment in shared memory, readable by window like a MappedAlignment."""
+
+	def __init__(self, data):
+		self._owner = True
+		self._shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+		self.data = np.ndarray(data.shape, dtype=np.uint8, buffer=self._shm.buf)
+		self.data[:] = data
+
+	@property
+	def n_sites(self):
+		return self.data.shape[1]
+
+	def window(self, start, stop):
+		return self.data[:, start:stop]
+
+	def __getstate__(self):
+		return self._shm.name, self.data.shape
+
+	def __setstate__(self, state):
+		name, shape = state
+		self._owner = False
+		self._shm = shared_memory.SharedMemory(name=name)
+		self.data = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf)
+
+	def close(self):
+		"""Release the shared block; the creating process also removes it."""
+		self.data = None
+		self._shm.close()
+		if self._owner:
+			self._shm.unlink()
+
+
+#State of a worker process, set once by _init_worker.
+_worker = {}
+
+
+def _init_worker(source, func, args):
+	_worker.update(source=source, func=func, args=args)
+
+
+def _run_window(start, stop):
+	return _worker["func"](_worker["source"].window(start, stop), *_worker["args"])
+
+
+def map_windows(func, source, n_jobs, size, args=(), first=0):
+	"""Yield (start, func(window, *args)) for consecutive windows of at most size sites of source from site first, in
+	order.
+
+	source is a taxa x sites uint8 array or a stream.MappedAlignment. With n_jobs > 1 the windows are recoded by a
+	pool of n_jobs processes, an array being placed in shared memory for them first. No more than two windows per
+	worker are in flight at once, so memory stays bounded when results are consumed more slowly than produced.
+	"""
+	if n_jobs <= 1:
+		for start in range(first, _n_sites(source), size):
+			yield start, func(_window(source, start, start + size), *args)
+		return
+
+	shared = SharedAlignment(source) if isinstance(source, np.ndarray) else None
+	try:
+		with multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(source if shared is None else shared, func, args)) as pool:
+			pending = collections.deque()
+			for start in range(first, _n_sites(source), size):
+				pending.append((start, pool.apply_async(_run_window, (start, start + size))))
+				if len(pending) >= 2 * n_jobs:
+					start, result = pending.popleft()
+					yield start, result.get()
+			while pending:
+				start, result = pending.popleft()
+				yield start, result.get()
+	finally:
+		if shared is not None:
+			shared.close()
+
+
+def _n_sites(source):
+	return source.shape[1] if isinstance(source, np.ndarray) else source.n_sites
+
+
+def _window(source, start, stop):
+	return source[:, start:stop] if isinstance(source, np.ndarray) else source.window(start, stop)
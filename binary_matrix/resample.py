@@ -0,0 +1,148 @@
+########################################################################################################################
+#
+#  resample.py
+#
+#  Bootstrap and jackknife replicates of a binary matrix, drawn from the matrix in memory instead of re-parsing its
+#	text output. A replicate is a weight per resampled unit:
+#	- bootstrap: as many units drawn with replacement as there are, the weight is how often a unit was drawn,
+#	- jackknife: a fraction of the units drawn without replacement, the weight is 1 for those kept and 0 otherwise.
+#	The units are either the sites of the alignment, every column then getting the weight of its site so the binary
+#	columns of a site stay together, or the binary columns themselves.
+#
+#  Every replicate has its own random generator spawned from the seed (numpy.random.SeedSequence), so the replicates
+#	are the same whatever the number of threads drawing them and replicate i does not depend on how many are drawn.
+#
+#  Replicates are written as weight vectors, one line of column weights per replicate, or as matrices, one phylip
+#	matrix per replicate one after the other (the layout of seqboot outfiles) with every column repeated its weight
+#	times.
+#
+########################################################################################################################
+
+import collections
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from binary_matrix.compress import open_output
+
+#Resampling methods, units and replicate output formats.
+METHODS = ["bootstrap", "jackknife"]
+UNITS = ["sites", "columns"]
+REPLICATE_FORMATS = ["weights", "phy"]
+
+_ZERO, _SPACE, _NEWLINE = (ord(c) for c in "0 \n")
+
+#Replicates drawn at a time per thread, bounds the weights held in memory.
+_BATCH = 4
+
+#Cells of a replicate matrix computed at once by write_replicates(), bounds the rows of text held in memory.
+_CELLS = 1 << 24
+
+#The replicates a run writes for every output matrix: n_replicates of method drawn over unit, written as format.
+#fraction is the fraction of the units a jackknife replicate keeps.
+Resampling = collections.namedtuple("Resampling", ["method", "n_replicates", "unit", "seed", "format", "fraction"],
+	defaults=("sites", None, "weights", 0.5))
+
+
+def replicate_weights(n_units, n_replicates, method="bootstrap", seed=None, n_jobs=1, fraction=0.5, groups=None):
+	"""Iterate over the weights of n_replicates resamples of n_units units, in order, drawn by n_jobs threads.
+
+	With groups, the group of every unit, the weights are summed per group: e.g. the inverse of engine.site_patterns()
+	gives replicates of site pattern weights.
+	"""
+	if method not in METHODS:
+		raise ValueError("Resampling method %s is not one of %s." % (method, ", ".join(METHODS)))
+	kept = int(round(fraction * n_units))
+	n_groups = n_units if groups is None else int(groups.max()) + 1 if len(groups) else 0
+
+	def draw(seed):
+		rng = np.random.default_rng(seed)
+		if method == "bootstrap":
+			drawn = rng.integers(0, n_units, n_units) if n_units else np.empty(0, dtype=np.intp)
+		else:
+			drawn = rng.choice(n_units, kept, replace=False)
+		return np.bincount(drawn if groups is None else groups[drawn], minlength=n_groups)
+
+	seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+	if n_jobs <= 1:
+		for replicate_seed in seeds:
+			yield draw(replicate_seed)
+		return
+	with ThreadPool(n_jobs) as pool:
+		for start in range(0, n_replicates, _BATCH * n_jobs):
+			for weights in pool.map(draw, seeds[start:start + _BATCH * n_jobs]):
+				yield weights
+
+
+def column_weights(matrix, resampling, n_sites=None, n_jobs=1):
+	"""Iterate over the weight of every column of matrix in each replicate of a Resampling.
+
+	Resampling sites draws over the n_sites sites of the alignment (by default up to the last site with a column), so
+	sites without columns, e.g. the invariant sites of a reduced matrix, are drawn too.
+	"""
+	if resampling.unit not in UNITS:
+		raise ValueError("Resampling unit %s is not one of %s." % (resampling.unit, ", ".join(UNITS)))
+	if resampling.unit == "columns":
+		n_units = matrix.n_columns
+	else:
+		n_units = n_sites if n_sites is not None else int(matrix.sites.max()) + 1 if matrix.n_columns else 0
+	weights = replicate_weights(n_units, resampling.n_replicates, resampling.method, resampling.seed, n_jobs,
+		resampling.fraction)
+	if resampling.unit == "columns":
+		return weights
+	sites = np.asarray(matrix.sites)
+	return (site_weights[sites] for site_weights in weights)
+
+
+def format_weights(weights):
+	"""Return a line of space separated weights as a uint8 character array."""
+	weights = np.asarray(weights)
+	if not len(weights):
+		return np.array([_NEWLINE], dtype=np.uint8)
+	if weights.max() < 10:		#Bootstrap weights nearly always are single digits.
+		text = np.full(2 * len(weights), _SPACE, dtype=np.uint8)
+		np.add(weights, _ZERO, out=text[0::2], casting="unsafe")
+		text[-1] = _NEWLINE
+		return text
+	weights = weights.astype(np.int64)
+	digits = np.ones(len(weights), dtype=np.intp)
+	power = 10
+	while power <= weights.max():
+		digits += weights >= power
+		power *= 10
+	last = np.cumsum(digits + 1) - 2	#Offset of the last digit of every weight.
+	text = np.full(last[-1] + 2, _SPACE, dtype=np.uint8)
+	for place in range(digits.max()):
+		written = digits > place
+		text[last[written] - place] = _ZERO + weights[written] % 10
+		weights = weights // 10
+	text[-1] = _NEWLINE
+	return text
+
+
+def write_weights(path, weights, n_jobs=1, compress=None):
+	"""Write one line of weights per replicate, compressed by n_jobs threads with a compress compression."""
+	with open_output(path, compress, n_jobs) as OUT:
+		for replicate in weights:
+			OUT.write(format_weights(replicate))
+
+
+def write_replicates(path, matrix, names, rows, weights, n_jobs=1, compress=None):
+	"""Write a phylip matrix per replicate, one after the other, every column of matrix repeated its weight times.
+
+	names are the taxa of the output lines and rows the matrix row written on each of them, and compress the
+	compression of the file, as in write_matrix(). Only a block of rows of a replicate is held as text at a time.
+	"""
+	columns = np.arange(matrix.n_columns)
+	names, rows = list(names), list(rows)
+	with open_output(path, compress, n_jobs) as OUT:
+		for replicate in weights:
+			resampled = matrix.select(np.repeat(columns, replicate))		#Shares the cells of matrix.
+			OUT.write(("%d\t%d\n" % (matrix.n_taxa, resampled.n_columns)).encode())
+			step = max(1, _CELLS // max(1, resampled.n_columns))
+			for start in range(0, len(rows), step):
+				text = resampled.to_bytes(rows[start:start + step])
+				for name, line in zip(names[start:start + step], text):
+					OUT.write((name + "\t").encode())
+					OUT.write(line)
+					OUT.write(b"\n")
@@ -0,0 +1,62 @@
+########################################################################################################################
+#
+#  stats.py
+#
+#  Per-stage instrumentation of a run: wall and CPU time, peak memory and the counts of sites and columns, written
+#	as JSON by the scripts' --stats option. The CPU time of a stage includes the worker processes that finished
+#	during it (-j), and the peak memory is the peak resident size of this process up to the end of the stage.
+#
+########################################################################################################################
+
+import contextlib
+import json
+import resource
+import sys
+import time
+
+
+def _peak_rss_kb():
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak // 1024 if sys.platform == "darwin" else peak	#ru_maxrss is in bytes on macOS, KB elsewhere.
+
+
+def _cpu_seconds():
+	own = resource.getrusage(resource.RUSAGE_SELF)
+	children = resource.getrusage(resource.RUSAGE_CHILDREN)
+	return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class Stats(object):
+	"""Stage timings and counts of a run.
+
+	Wrap each stage in "with stats.stage(name):" and record counts with stats.count(name=value); write() saves them.
+	"""
+
+	def __init__(self):
+		self.stages = []
+		self.counts = {}
+		self._start = time.perf_counter(), _cpu_seconds()
+
+	@contextlib.contextmanager
+	def stage(self, name):
+		wall, cpu = time.perf_counter(), _cpu_seconds()
+		try:
+			yield
+		finally:
+			self.stages.append({"name": name, "wall_seconds": time.perf_counter() - wall, "cpu_seconds": _cpu_seconds() - cpu,
+				"peak_rss_kb": _peak_rss_kb()})
+
+	def count(self, **counts):
+		"""Record counts, adding to those already recorded under the same names."""
+		for name, value in counts.items():
+			self.counts[name] = self.counts.get(name, 0) + int(value)
+
+	def report(self):
+		"""Return the stages, counts and totals as a dictionary."""
+		return {"stages": self.stages, "counts": self.counts, "wall_seconds": time.perf_counter() - self._start[0],
+			"cpu_seconds": _cpu_seconds() - self._start[1], "peak_rss_kb": _peak_rss_kb()}
+
+	def write(self, path):
+		with open(path, "w") as OUT:
+			json.dump(self.report(), OUT, indent=1)
+			OUT.write("\n")
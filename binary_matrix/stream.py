@@ -0,0 +1,153 @@
+########################################################################################################################
+#
+#  stream.py
+#
+#  Memory-mapped access to a sequential alignment file (phylip or simple "name sequence" lines), so the matrix can be
+#	recoded one window of sites at a time. Only the byte offset of every sequence is kept in memory; a window is
+#	copied out of the mapping as a taxa x sites uint8 array of upper-cased character codes.
+#
+#  A compressed file cannot be mapped, so it is first decompressed to a temporary file that is mapped instead.
+#
+########################################################################################################################
+
+import mmap
+import os
+import re
+
+import numpy as np
+
+from binary_matrix.alignment import PHYLIP_HEADER, UPPER, detect_format
+from binary_matrix.compress import decompressed_copy, is_compressed
+
+#Default number of sites recoded per window (--stream) or per block (-j): as many as keep a window under WINDOW_CELLS
+#taxa x sites cells, so the memory of a window does not grow with the number of taxa, and at most WINDOW.
+WINDOW = 100000
+WINDOW_CELLS = 1 << 21
+
+_LINE = re.compile(br"(\S*)\s+(\S*)")
+
+
+def window_size(n_taxa, window=None):
+	"""Return the sites per window of an alignment of n_taxa taxa: window if it is given, else the default above."""
+	if window is not None:
+		return window
+	return max(1, min(WINDOW, WINDOW_CELLS // max(n_taxa, 1)))
+
+
+class MappedAlignment(object):
+	"""Index of the sequences of an alignment file, read through a read-only memory map.
+
+	names lists the taxon of every sequence line in file order (the output order); taxa lists each distinct taxon
+	once, in dictionary order, and is the row order of the windows. As with a dictionary, a repeated taxon keeps
+	the sequence of its last line. header is a compiled regex (alignment.PHYLIP_HEADER) recognising a header on the
+	first line (Method 1) and skip_first skips the first line unconditionally (Method 2 -p y). FASTA, NEXUS and
+	interleaved phylip files raise ValueError; they can only be read with alignment.parse_alignment().
+	"""
+
+	def __init__(self, path, header=None, skip_first=False):
+		self.path = path
+		self.format = "text"
+		self.names = []
+		self.n_sites = 0
+
+		self._owner = True
+		self._copy = decompressed_copy(path) if is_compressed(path) else None
+		try:
+			self._open()
+			self._index(header, skip_first)
+		except BaseException:
+			self.close()
+			raise
+
+	def _index(self, header, skip_first):
+		#Find the name and sequence offset of every line.
+		path = self.path
+		offsets = {}
+		sizes = None
+
+		pos = 0
+		end_of_file = len(self._map)
+		first = True
+		while pos < end_of_file:
+			end = self._line_end(pos)
+			if first and self._map[pos:end].strip():
+				#Only the first line can be a header, and only sequential files have fixed sequence offsets.
+				first = False
+				start = self._map[pos:min(end, pos + 256)]
+				if detect_format(start) in ("fasta", "nexus"):
+					raise ValueError("%s: %s input cannot be streamed, only phylip or simple text." % (path, detect_format(start)))
+				numbers = (header or PHYLIP_HEADER).match(start)
+				if skip_first or (header is not None and numbers):
+					if numbers:
+						self.format = "phylip"
+						sizes = (int(numbers.group(1)), int(numbers.group(2)))
+					pos = end + 1
+					continue
+			line = _LINE.match(self._map, pos, end)
+			if line is None:
+				if self._map[pos:end].strip():
+					raise ValueError("%s: line without a sequence: %r" % (path, self._map[pos:min(end, pos + 60)]))
+			elif line.start(1) != line.end(1):
+				name = line.group(1).decode()
+				length = line.end(2) - line.start(2)
+				if sizes is not None and length < sizes[1]:
+					#Checked on the first block, the unnamed lines of the next interleaved block have no sequence to check.
+					raise ValueError("%s: sequences are shorter than the %d characters of the header, interleaved phylip input cannot be streamed." % (path, sizes[1]))
+				if self.n_sites == 0:
+					self.n_sites = length
+				elif length != self.n_sites:
+					raise ValueError("Error, %s has different number of characters (%d is not %d)" % (name, self.n_sites, length))
+				self.names.append(name)
+				offsets[name] = line.start(2)
+			pos = end + 1
+
+		self.taxa = list(offsets)
+		self.offsets = [offsets[taxon] for taxon in self.taxa]
+		self.last_taxon = self.names[-1] if self.names else None
+
+	def row(self, taxon):
+		"""Return the window row of a taxon."""
+		try:
+			return self.taxa.index(taxon)
+		except ValueError:
+			raise KeyError("Taxon %s is not in the alignment." % (taxon,))
+
+	def _open(self):
+		with open(self.path if self._copy is None else self._copy, "rb") as handle:
+			self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if handle.seek(0, 2) else b""
+
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		del state["_map"]
+		return state
+
+	def __setstate__(self, state):
+		#Worker processes map the file again instead of receiving its contents.
+		self.__dict__.update(state)
+		self._owner = False
+		self._open()
+
+	def _line_end(self, pos):
+		end = self._map.find(b"\n", pos)
+		return len(self._map) if end < 0 else end
+
+	def window(self, start, stop):
+		"""Return sites [start, stop) of every taxon as a taxa x sites uint8 array of upper-cased codes."""
+		stop = min(stop, self.n_sites)
+		data = np.empty((len(self.taxa), stop - start), dtype=np.uint8)
+		for row, offset in enumerate(self.offsets):
+			data[row] = np.frombuffer(self._map, dtype=np.uint8, count=stop - start, offset=offset + start)
+		return UPPER[data]
+
+	def windows(self, size=WINDOW):
+		"""Iterate over (start, data) for consecutive windows of at most size sites."""
+		for start in range(0, self.n_sites, size):
+			yield start, self.window(start, start + size)
+
+	def close(self):
+		"""Unmap the file; the creating process also removes the decompressed copy of a compressed file."""
+		if isinstance(getattr(self, "_map", None), mmap.mmap):
+			self._map.close()
+		if self._owner and self._copy is not None:
+			os.unlink(self._copy)
+			self._copy = None
@@ -0,0 +1,112 @@
+########################################################################################################################
+#
+#  uib.py
+#
+#  Method 2 recoding of a window of an integer-coded DNA alignment relative to the outgroup. For every site, each
+#	base (G, A, T or C) other than the outgroup base gets one column in which a taxon has:
+#		the outgroup base / 0 if it has the outgroup base,
+#		the base / 1 if it has that base,
+#		? otherwise,
+#	in the recoded sequence / binary matrices. The UIB matrix adds one more column per site holding the outgroup base
+#	or ?.
+#
+#  The bases of every site are found for the whole block at once (first row of each base, sorted per site) and the
+#	cells of all columns are then picked out of the block in bulk, so there is no loop over sites.
+#
+#  binarize_uib() recodes a whole Alignment; recode_block() does the work on a block of sites for the scripts.
+#
+########################################################################################################################
+
+import collections
+
+import numpy as np
+
+from binary_matrix import engine
+
+#The recoded matrices of an alignment: taxa x columns uint8 character arrays (rows in the alignment's taxa order) and
+#the SiteBases of the sites.
+UIBMatrices = collections.namedtuple("UIBMatrices", ["sequence", "binary", "uib", "bases"])
+
+BASES = np.frombuffer(b"GATC", dtype=np.uint8)
+
+_ZERO, _ONE, _MISSING = (ord(c) for c in "01?")
+
+
+class SiteBases(collections.namedtuple("SiteBases", ["out_bases", "sites", "codes"])):
+	"""The outgroup base of every site, and the site and base of every recoded column, as arrays."""
+
+	def per_site(self, start=0):
+		"""Yield (site number from 1, outgroup base, other bases) for every site, with the sites numbered from start."""
+		per_site = np.bincount(self.sites, minlength=len(self.out_bases))
+		ends = np.cumsum(per_site)
+		for site, (out_base, first, end) in enumerate(zip(self.out_bases, ends - per_site, ends)):
+			yield start + site + 1, out_base, self.codes[first:end]
+
+	def invariant(self):
+		"""Return the number of sites without a base other than the outgroup base."""
+		return int(np.count_nonzero(np.bincount(self.sites, minlength=len(self.out_bases)) == 0))
+
+
+def join_bases(blocks):
+	"""Join the SiteBases of consecutive windows into those of the whole alignment."""
+	offsets = np.cumsum([0] + [len(block.out_bases) for block in blocks])
+	return SiteBases(np.concatenate([block.out_bases for block in blocks] or [np.empty(0, dtype=np.uint8)]),
+		np.concatenate([block.sites + offset for block, offset in zip(blocks, offsets)] or [np.empty(0, dtype=np.intp)]),
+		np.concatenate([block.codes for block in blocks] or [np.empty(0, dtype=np.uint8)]))
+
+
+def site_bases(data, outgroup, first=None):
+	"""Return (sites, codes): the site and base of every recoded column of a taxa x sites block.
+
+	The columns of a site are its bases (G, A, T or C) other than the outgroup base, in order of first appearance.
+	first is the state table of the BASES in data (engine.first_rows()) if it is already known.
+	"""
+	n_taxa, n_sites = data.shape
+	out_bases = data[outgroup]
+
+	#Row in which each base is first seen at each site (n_taxa if it is absent or is the outgroup base).
+	first = engine.first_rows(data, BASES) if first is None else first.copy()
+	first[BASES[:, np.newaxis] == out_bases] = n_taxa
+
+	order = np.argsort(first, axis=0, kind="stable")
+	observed = (np.take_along_axis(first, order, axis=0) < n_taxa).T
+	sites, rank = np.nonzero(observed)
+	return sites, BASES[order.T[sites, rank]]
+
+
+def recode_block(data, outgroup, first=None):
+	"""Recode a taxa x sites window, with the state table of its BASES if it is already known (see site_bases()).
+
+	Returns the (sequence, binary, uib) uint8 character blocks and the SiteBases of the window.
+	"""
+	n_taxa, n_sites = data.shape
+	out_bases = data[outgroup]
+	sites, codes = site_bases(data, outgroup, first)
+
+	cells = data.take(sites, axis=1)
+	is_out = cells == out_bases[sites]
+	is_nuc = cells == codes
+	missing = ~(is_out | is_nuc)
+	sequence = cells.copy()
+	sequence[missing] = _MISSING
+	binary = np.where(is_out, np.uint8(_ZERO), np.where(is_nuc, np.uint8(_ONE), np.uint8(_MISSING)))
+
+	#Every site's columns are followed by the extra column with the outgroup base or ?, so column j of site s moves
+	#s columns to the right.
+	uib = np.empty((n_taxa, len(sites) + n_sites), dtype=np.uint8)
+	uib[:, np.arange(len(sites)) + sites] = sequence
+	uib[:, np.cumsum(np.bincount(sites, minlength=n_sites)) + np.arange(n_sites)] = np.where(data == out_bases, data, np.uint8(_MISSING))
+	return sequence, binary, uib, SiteBases(out_bases.copy(), sites, codes)
+
+
+def column_count(data, outgroup):
+	"""Return the number of sequence/binary columns of a window; the UIB matrix has one more per site."""
+	out_bases = data[outgroup]
+	return int(sum(((data == base).any(axis=0) & (out_bases != base)).sum() for base in BASES))
+
+
+def binarize_uib(alignment, outgroup=None):
+	"""Recode an Alignment relative to an outgroup taxon (by default its last taxon) into UIBMatrices."""
+	if outgroup is None:
+		outgroup = alignment.last_taxon
+	return UIBMatrices(*recode_block(alignment.data, alignment.row(outgroup)))
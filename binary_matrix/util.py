@@ -0,0 +1,22 @@
+########################################################################################################################
+#
+#  util.py
+#
+#  Small helpers shared by the modules of the package.
+#
+########################################################################################################################
+
+import os
+
+
+def detach(path):
+	"""Remove the file at path, if there is one, before an output is written there: it may be a hard link to a cached
+	file (see cache.py), which must not be written through.
+	"""
+	if os.path.lexists(path):
+		os.unlink(path)
+
+
+def quiet(message):
+	"""Default log callable of the run() functions: messages are dropped."""
+	pass
@@ -0,0 +1,185 @@
+########################################################################################################################
+#
+#  writers.py
+#
+#  Output of matrices whose size is known before any cell is computed. Every row has a fixed width once the number
+#	of columns is known, so the file is laid out up front (header, taxon names, newlines) and the cells are then
+#	written straight to their final offsets with pwrite(), without holding whole rows in memory.
+#
+#  Disjoint parts of a laid out file can be written at once, so write_matrix() has several threads each compute and
+#	write whole rows: numpy and pwrite() release the interpreter lock while they work. MatrixFileWriter is filled
+#	window by window as the windows are recoded.
+#
+#  Outputs written with a compression (see compress.py) cannot be laid out, as compressed offsets are not known in
+#	advance: write_matrix() then writes the lines in order and MatrixFileWriter lays out a temporary uncompressed file
+#	that is compressed when it is closed.
+#
+#  A MatrixFileWriter can also reopen a file it was filling, as it is, and carry on from a given number of bytes per
+#	row: a run resumed from a checkpoint (see checkpoint.py) keeps the windows written before it was stopped.
+#
+########################################################################################################################
+
+import collections
+import os
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from binary_matrix.compress import CompressedWriter, compress_file
+from binary_matrix.util import detach
+
+_COMMA = ord(",")
+
+#Columns of a row computed at once by write_matrix(), bounds the size of the temporaries of very long rows.
+_RUN = 1 << 24
+
+
+def csv_cells(text):
+	"""Prefix every cell of a uint8 character row, or rows x columns block, with a comma."""
+	cells = np.empty(text.shape[:-1] + (2 * text.shape[-1],), dtype=np.uint8)
+	cells[..., 0::2] = _COMMA
+	cells[..., 1::2] = text
+	return cells
+
+
+def write_matrix(path, matrix, names, rows, n_taxa=None, csv=False, separator="\t", n_jobs=1, compress=None):
+	"""Write a BinaryMatrix or OneHotMatrix, or a taxa x columns uint8 character block, as "name<separator>cells" lines.
+
+	names are the taxa of the output lines and rows the matrix row written on each of them. With n_taxa a phylip
+	header line is written first and with csv every cell is preceded by a comma. With n_jobs > 1 the rows of the
+	matrix are computed and written by n_jobs threads, or compressed by n_jobs threads with a compress compression
+	("gz", "bz2" or "xz").
+	"""
+	matrix_object = not isinstance(matrix, np.ndarray)
+	n_columns = matrix.n_columns if matrix_object else matrix.shape[1]
+	if n_columns <= _RUN:
+		parts = [(0, matrix if matrix_object else slice(None))]
+	else:
+		parts = [(start, matrix.select(slice(start, start + _RUN)) if matrix_object else slice(start, start + _RUN))
+			for start in range(0, n_columns, _RUN)]
+
+	def cells(row):
+		for start, part in parts:
+			text = part.to_bytes(row) if matrix_object else matrix[row, part]
+			yield start, csv_cells(text) if csv else text
+
+	if compress is not None:
+		with CompressedWriter(path, compress, n_jobs) as OUT:
+			if n_taxa is not None:
+				OUT.write(("%d\t%d\n" % (n_taxa, n_columns)).encode())
+			for name, row in zip(names, rows):
+				OUT.write((name + separator).encode())
+				for start, text in cells(row):
+					OUT.write(text)
+				OUT.write(b"\n")
+		return
+
+	cell_width = 2 if csv else 1
+	OUT = MatrixFile(path, names, rows, n_columns, cell_width, separator, n_taxa)
+
+	def fill(row):
+		for start, text in cells(row):
+			OUT.fill(start * cell_width, text[np.newaxis], row)
+
+	try:
+		written = sorted(set(rows))
+		if n_jobs > 1 and len(written) > 1:
+			with ThreadPool(n_jobs) as pool:
+				pool.map(fill, written, chunksize=max(1, len(written) // (4 * n_jobs)))
+		else:
+			for row in written:
+				fill(row)
+	finally:
+		OUT.close()
+
+
+class MatrixFile(object):
+	"""A "name<separator>cells" matrix file of fixed width lines, laid out up front.
+
+	names are the taxa of the output lines and rows the matrix row written on each of them. cell_width is the
+	number of bytes per column (2 for ",0" style csv cells). With n_taxa a phylip header line is written first.
+	Disjoint blocks of cells may be filled by several threads at once. With reopen the file is expected to be laid out
+	already and is opened as it is (ValueError if it is missing or does not have the size of the layout).
+	"""
+
+	def __init__(self, path, names, rows, n_columns, cell_width=1, separator="\t", n_taxa=None, reopen=False):
+		self.path = path
+		self.width = n_columns * cell_width
+		if not reopen:
+			detach(path)
+		elif not os.path.exists(path):
+			raise ValueError("%s is not laid out for this matrix and cannot be filled further, remove the checkpoint to "
+				"start again." % (path,))
+		self._fd = os.open(path, os.O_RDWR if reopen else os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o666)
+
+		layout = []
+		offset = 0
+		if n_taxa is not None:
+			header = ("%d\t%d\n" % (n_taxa, n_columns)).encode()
+			layout.append((offset, header))
+			offset += len(header)
+		self._lines = collections.defaultdict(list)		#Offsets of the cells of the lines of every matrix row.
+		for name, row in zip(names, rows):
+			prefix = (name + separator).encode()
+			layout.append((offset, prefix))
+			self._lines[row].append(offset + len(prefix))
+			offset += len(prefix) + self.width
+			layout.append((offset, b"\n"))
+			offset += 1
+
+		if reopen:
+			if os.fstat(self._fd).st_size != offset:
+				os.close(self._fd)
+				raise ValueError("%s is not laid out for this matrix and cannot be filled further, remove the checkpoint to "
+					"start again." % (path,))
+			return
+		os.ftruncate(self._fd, offset)
+		for position, text in layout:
+			os.pwrite(self._fd, text, position)
+
+	def fill(self, start, text, first_row=0):
+		"""Write a block of cells, a rows x bytes uint8 array of matrix rows first_row, first_row + 1, ..., on the
+		lines of those rows from byte start of their cells.
+		"""
+		for row, row_text in enumerate(text, first_row):
+			for offset in self._lines.get(row, ()):
+				os.pwrite(self._fd, np.ascontiguousarray(row_text), offset + start)
+
+	def sync(self):
+		"""Flush the cells written so far to disk."""
+		os.fsync(self._fd)
+
+	def close(self):
+		os.close(self._fd)
+
+
+class MatrixFileWriter(MatrixFile):
+	"""A MatrixFile filled column window by column window, in order.
+
+	With a compress compression the file is laid out uncompressed next to it, then compressed by threads threads on
+	close(). With filled, the number of bytes per row already written, the file (or its uncompressed copy) is reopened
+	as it is and filled from there.
+	"""
+
+	def __init__(self, path, names, rows, n_columns, cell_width=1, separator="\t", n_taxa=None, threads=1, filled=None,
+			compress=None):
+		self.compressed_path = path if compress is not None else None
+		self.compress = compress
+		self.threads = threads
+		if compress is not None:
+			path = (path[:-len(compress) - 1] if path.endswith("." + compress) else path) + ".tmp"
+		MatrixFile.__init__(self, path, names, rows, n_columns, cell_width, separator, n_taxa, reopen=filled is not None)
+		self.filled = filled or 0
+
+	def write(self, text):
+		"""Write the next block of cells, a matrix rows x cells uint8 array."""
+		self.fill(self.filled, text)
+		self.filled += text.shape[1]
+
+	def close(self):
+		MatrixFile.close(self)
+		if self.filled != self.width:
+			raise ValueError("%s: %d of %d bytes per row were written" % (self.path, self.filled, self.width))
+		if self.compressed_path is not None:
+			compress_file(self.path, self.compressed_path, self.compress, self.threads)
+			os.unlink(self.path)
@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 
 import argparse
-import re
+
+from binary_matrix import method1
+from binary_matrix.cache import DEFAULT_SIZE, ResultCache
+from binary_matrix.compress import COMPRESSIONS
+from binary_matrix.distance import METRICS
+from binary_matrix.resample import REPLICATE_FORMATS, UNITS, Resampling
+from binary_matrix.stats import Stats
+from binary_matrix.stream import WINDOW, WINDOW_CELLS
 
 ########################################################################################################################
 #
@@ -15,14 +22,62 @@ import re
 #	7,8) Same as 5&6, but removing invariant characters.
 # 
 #	Usage: python make_binary_matrix.py -i infile -o outfile -g outgroup -c DNA 
-#		-i: Input file, may be in phylip (non-interleaved) or simple text format.
+#		-i: Input file, may be in phylip (sequential or interleaved), FASTA, NEXUS or simple text format, recognised
+#			from its first line. --stream needs sequential phylip or simple text. gzip, bzip2 and xz compressed
+#			files are read directly (--stream decompresses them to a temporary file first).
 #		-c: Matrix character type (DNA, AA, or MULTI). Default is DNA
 #		-a: Characters used for ambiguous or missing data
 #			* If -c DNA, the assumption is -a RYKMSWNBDHV? if others are used, use -a with list of characters
 #			* If -c AA, the assumption is -a X? if others are used, use -a with list of characters
 #			* If -c MULTI, the assumption is only -a ? again, if others are used, use -a with list of characters
 #		-o: output base see above for full names.
-#		-g: Outgroup taxon name, must be identical to name in file. If not supplied, last taxon is used.
+#		-g: Outgroup taxon name, must be identical to name in file. If not supplied, last taxon is used. Several
+#			outgroups may be given, comma separated or with -g repeated: the binary matrix is built once and 5-8 are
+#			written for each, named outfile.binary.polarized.OUTGROUP and outfile.binary.polarized.reduced.OUTGROUP.
+#		--outputs: Comma separated outputs to write, by default all 8. Each is a matrix (all, reduced, polarized,
+#			polarized.reduced) for its phylip and csv files, or a matrix and format (phy, csv or npz), e.g.
+#			polarized.reduced.phy. Only the matrices needed for the selected outputs are computed.
+#		--npz: Also write outfile.binary.all.npz, .reduced.npz, .polarized.npz and .polarized.reduced.npz, bit-packed
+#			copies of the matrices (2 bits per cell) that binary_matrix.matrix.load_npz() can memory-map.
+#		--stream: Memory-map the input (phylip non-interleaved or simple text) and recode it in windows of --window
+#			sites, writing each window to the outputs as it is done. Memory use is bounded by taxa x window. By default a
+#			window has as many sites as fit in 2M cells (about 10000 sites for 200 taxa), at most 100000.
+#		-j: Number of processes. Blocks of --window sites are recoded in parallel and joined in order, the output is
+#			the same as with one process. Without --stream, as many threads then write the rows of each output.
+#		--stats: Write the wall and CPU time and peak memory of every stage, and the site and column counts, to a
+#			JSON file.
+#		--index: Also write outfile.binary.index.npz, the per-site index of the alignment (its character codes and the
+#			states of every binary column) that --append extends. It holds the whole alignment, deflated: expect
+#			under half the size of the input file on disk.
+#		--append: The input holds new taxa to add to the alignment indexed at outfile. Only the new rows are searched
+#			for new states, which add binary columns after those of their site; every output and the index are
+#			rewritten with the new taxa, the index last and replaced in one step, so a run stopped part way can be
+#			repeated. Polarized against the indexed outgroups unless -g is given. make_binary_matrix_Method_2.py has
+#			no --append: adding taxa there means recoding the whole alignment again.
+#		--cache: Directory of a result cache. Outputs of an input file already recoded with the same options are
+#			copied from the cache instead of being recomputed; new outputs are added to it.
+#		--cache-size: Size limit of the cache in MB [10240]; least recently used outputs are removed beyond it.
+#		--cache-link: Hard-link outputs from the cache instead of copying them. They must then not be edited in place.
+#		-z: Compress the text outputs with gz (BGZF, readable by gzip and samtools/tabix), bz2 or xz; their names
+#			get the suffix. Blocks are compressed by -j threads while the outputs are being written.
+#		--bootstrap N / --jackknife N: Also draw N bootstrap (sites drawn with replacement) or jackknife (half the sites
+#			kept) replicates of every output matrix, from the matrices in memory, with -j threads. Written to
+#			outfile.binary.MATRIX.bootstrap.weights (or .jackknife.weights), a line of column weights per replicate.
+#		--resample: Resample the sites of the alignment, all binary columns of a site getting its weight (default), or
+#			the binary columns one by one.
+#		--replicates: Write the replicates as weights (default) or as phy, the N resampled phylip matrices one after
+#			the other in outfile.binary.MATRIX.bootstrap.phy.
+#		--seed: Seed of the replicates; the same seed gives the same replicates whatever -j. Without it a seed is
+#			drawn and printed.
+#		--distances: Also write the pairwise distances between the taxa of every output matrix, skipping ? cells, as a
+#			PHYLIP distance matrix outfile.binary.MATRIX.hamming.dist (or .jaccard.dist). hamming is the fraction of
+#			the columns compared in which two taxa differ, jaccard leaves out the columns where both are 0. Computed
+#			on bit-packed rows by -j threads; with --stream window by window.
+#		--checkpoint: With --stream, a directory the progress is saved to after every window: the outputs written so
+#			far are flushed to disk and a small manifest records the next window. A killed run only loses the window
+#			it was recoding. The directory is removed when the run finishes.
+#		--resume: Carry on from the last checkpoint in --checkpoint of a run of the same input, options and -o, keeping
+#			the windows already written to the outputs. Without a checkpoint there the run starts from the beginning.
 ########################################################################################################################
 #
 #	Written by: Matt Gitzendanner
@@ -38,11 +93,27 @@ import re
 #		2.0: Dec. 18, 2013: Modified to accept AA and multi-state character datasets and changed outputs a bit.
 #		2.1: Dec. 19, 2013: Bug fixes in handling of characters.
 #		2.2: Jan. 1, 2014: Bug fix in polarizing characters.
+#		3.0: Binary matrices are built with the numpy engine in binary_matrix/engine.py instead of character by character.
+#		3.1: Matrices are held bit-packed until they are written, optional .npz output.
+#		3.2: --stream mode for alignments that do not fit in memory.
+#		3.3: -j option to recode blocks of sites in parallel.
+#		3.4: Identical site patterns are recoded once.
+#		3.5: The work is done by binary_matrix.method1.run(), the input is read only once.
+#		3.6: Interleaved phylip, FASTA and NEXUS input.
+#		3.7: --stats report.
+#		3.8: Polarizing against several outgroups in one run.
+#		3.9: --outputs selects the matrices and formats to compute and write.
+#		3.10: --cache of outputs.
+#		3.11: --index and --append to add taxa without recoding the indexed alignment.
+#		3.12: gzip, bzip2 and xz compressed input, -z to compress the outputs.
+#		3.13: --bootstrap and --jackknife replicates.
+#		3.14: --distances between taxa.
+#		3.15: --checkpoint and --resume for --stream runs.
 #
 #
 ########################################################################################################################
 
-version= "2.2"
+version= "3.15"
 
 #Parse commandline options.
 parser = argparse.ArgumentParser()
@@ -50,297 +121,102 @@ parser.add_argument("-i", help="Input matrix file")
 parser.add_argument("-o", help="Output matrix file")
 parser.add_argument("-c",default="DNA", help="Matrix character type (DNA, AA, MULTI)")
 parser.add_argument("-a", help="Characters used for ambiguous or missing data")
-parser.add_argument("-g", help="Outgroup taxon name, if not used, last taxon in dataset is used.")
+parser.add_argument("-g", action="append", help="Outgroup taxon name, if not used, last taxon in dataset is used. Repeat or separate with commas for several.")
+parser.add_argument("--outputs", help="Comma separated outputs, e.g. polarized.reduced.phy or reduced [all matrices as phy and csv].")
+parser.add_argument("--npz", action="store_true", help="Also write the four binary matrices as bit-packed .npz files.")
+parser.add_argument("--stream", action="store_true", help="Memory-map the input and recode it in windows of sites (bounded memory).")
+parser.add_argument("--window", type=int, help="Sites per window in --stream and -j modes [as many as fit in %d cells, at most %d]." %(WINDOW_CELLS, WINDOW))
+parser.add_argument("-j", type=int, default=1, help="Number of processes recoding blocks of sites in parallel [1].")
+parser.add_argument("--stats", help="Write per-stage timings, memory and column counts to this JSON file.")
+parser.add_argument("--index", action="store_true", help="Also save the per-site index used by --append.")
+parser.add_argument("--append", action="store_true", help="Add the taxa of the input to the alignment indexed at the output.")
+parser.add_argument("--cache", help="Directory of a cache of outputs keyed on the input and options.")
+parser.add_argument("--cache-size", type=int, default=DEFAULT_SIZE // 1024 ** 2, help="Cache size limit in MB [%d]." %(DEFAULT_SIZE // 1024 ** 2))
+parser.add_argument("--cache-link", action="store_true", help="Hard-link outputs from the cache instead of copying them.")
+parser.add_argument("-z", choices=COMPRESSIONS, help="Compress the text outputs (gz, bz2 or xz).")
+parser.add_argument("--checkpoint", help="With --stream, save the progress to this directory after every window.")
+parser.add_argument("--resume", action="store_true", help="Carry on from the last checkpoint of a stopped run.")
+resampling_method = parser.add_mutually_exclusive_group()
+resampling_method.add_argument("--bootstrap", type=int, metavar="N", help="Also write N bootstrap replicates of every matrix.")
+resampling_method.add_argument("--jackknife", type=int, metavar="N", help="Also write N jackknife replicates of every matrix.")
+parser.add_argument("--resample", choices=UNITS, default="sites", help="Resample sites (their columns together) or binary columns [sites].")
+parser.add_argument("--replicates", choices=REPLICATE_FORMATS, default="weights", help="Write replicates as column weights or phylip matrices [weights].")
+parser.add_argument("--seed", type=int, help="Seed of the bootstrap or jackknife replicates.")
+parser.add_argument("--distances", choices=METRICS, help="Also write the distances between taxa of every matrix (hamming or jaccard).")
 
 args = parser.parse_args()
 
 in_file = args.i
 out_file = args.o
 outgroup = args.g
+if outgroup:
+	outgroup = [name for names in outgroup for name in names.split(",") if name]
 data_type=args.c
 ambig_chars=args.a
+write_npz=args.npz
+outputs=args.outputs.split(",") if args.outputs else None
+stream=args.stream
+window=args.window
+n_jobs=args.j
+stats_file=args.stats
+cache=ResultCache(args.cache, args.cache_size * 1024 ** 2, link=args.cache_link) if args.cache else None
+resampling=None
+if args.bootstrap is not None:
+	if args.bootstrap < 1:
+		parser.error("argument --bootstrap: the number of replicates must be at least 1")
+	resampling=Resampling("bootstrap", args.bootstrap, args.resample, args.seed, args.replicates)
+elif args.jackknife is not None:
+	if args.jackknife < 1:
+		parser.error("argument --jackknife: the number of replicates must be at least 1")
+	resampling=Resampling("jackknife", args.jackknife, args.resample, args.seed, args.replicates)
 
 #Print some fancy output.
-print "\nmake_binary_matrix.py Verson: %s" %(version)
-print "Written by Matt Gitzendanner, University of Florida, Department of Biology\n"
-
-
-#Set output file names
-out_bin_all = out_file + ".binary.all.phy"
-out_bin_all_csv = out_file + ".binary.all.csv"
-out_bin_reduced = out_file + ".binary.reduced.phy"
-out_bin_reduced_csv = out_file + ".binary.reduced.csv"
-out_bin_polarized = out_file + ".binary.polarized.phy"
-out_bin_polarized_csv = out_file + ".binary.polarized.csv"
-out_bin_polarized_reduced = out_file + ".binary.polarized.reduced.phy"
-out_bin_polarized_reduced_csv = out_file + ".binary.polarized.reduced.csv"
-
-#Open the inputfile
-try:
-	IN = open (in_file, 'r')
-except OSError as exception:
-	pass
-
-
-#Setup empty dictionaries to store sequences.
-char_dict={}
-trans_char_dict={}
-trans_bin_dict={}
-trans_bin_csv_dict={}
-trans_bin_reduced_dict={}
-trans_bin_reduced_csv_dict={}
-trans_polarized_dict={}
-trans_polarized_csv_dict={}
-trans_polarized_reduced_dict={}
-trans_polarized_reduced_csv_dict={}
+print("\nmake_binary_matrix.py Verson: %s" %(version))
+print("Written by Matt Gitzendanner, University of Florida, Department of Biology\n")
 
 
 #Report Matrix type and (assumed) ambiguity codes
 
 if data_type == "DNA" :
-	print "Matrix data type is: DNA"
+	print("Matrix data type is: DNA")
 	if ambig_chars == None :
 		ambig_chars = list("RYKMSWNBDHV?")
-		print "No set of ambiguous characters was passes with -a option, so assuming %s." %(ambig_chars)
+		print("No set of ambiguous characters was passes with -a option, so assuming %s." %(ambig_chars))
 	else :
 		ambig_chars=list(ambig_chars)
-		print "The following characters are treated as ambiguous or missing: %s " %(ambig_chars)
+		print("The following characters are treated as ambiguous or missing: %s " %(ambig_chars))
 
 elif data_type == "AA" :
-	print "Matrix data type is: AA"
+	print("Matrix data type is: AA")
 	if ambig_chars == None :
-		print "No set of ambiguous characters was passes with -a option, so assuming 'X?'."
+		print("No set of ambiguous characters was passes with -a option, so assuming 'X?'.")
 		ambig_chars = ["X","?"]
 	else :
 		ambig_chars = list(ambig_chars)
-		print "The following characters are treated as ambiguous or missing: %s " %(ambig_chars)
+		print("The following characters are treated as ambiguous or missing: %s " %(ambig_chars))
 
 elif data_type == "MULTI" :
-	print "Matrix data type is: MULTI"
+	print("Matrix data type is: MULTI")
 	if ambig_chars == None :
-		print "No set of ambiguous characters was passes with -a option, so assuming '?'."
+		print("No set of ambiguous characters was passes with -a option, so assuming '?'.")
 		ambig_chars = ["?"]
 	else :
 		ambig_chars=list(ambig_chars)
-		print "The following characters are treated as ambiguous or missing: %s " %(ambig_chars)
+		print("The following characters are treated as ambiguous or missing: %s " %(ambig_chars))
 
 else :
-	print "Matrix character type was not set correctly %s is not one of the three options (DNA, AA, MULTI)." %(data_type)
+	print("Matrix character type was not set correctly %s is not one of the three options (DNA, AA, MULTI)." %(data_type))
 	quit()
 
-char_len=0	
-
-phylip=re.compile('\d*\s\d*')	#String to matching header in phylip file.
-
-for Line in IN :		#Read in_file into a dictionary with keys as taxa and values as sequences (all sequences are same length)
-	Line = Line.strip('\n')
-	if phylip.match(Line) : # If first line matches phylip header string defined above.
-		print "Input file detected as phylip format."
-	else :
-		Line_bits=re.split("\s+",Line)
-	
-		if Line_bits[0] == '' :		#Skip blank lines
-			continue
-		if char_len == 0 :				#Set Length from first sequence
-			char_len = len(Line_bits[1])
-			print "All input character sets should be %s characters long." %(char_len)
-		else :
-			if char_len != len(Line_bits[1]) :
-				print "Error, %s has different number of characters (%d is not %d)" %(Line_bits[0], char_len, len(Line_bits[1]) )	#if character lengths are not the same exit.
-				break
-
-		char_dict[Line_bits[0]]=Line_bits[1]
-		trans_char_dict[Line_bits[0]]=''			#Add the taxon names to all the dictionaries for output.
-		trans_bin_dict[Line_bits[0]]=''
-		trans_bin_csv_dict[Line_bits[0]]=''
-		trans_bin_reduced_dict[Line_bits[0]]=''
-		trans_bin_reduced_csv_dict[Line_bits[0]]=''
-		trans_polarized_dict[Line_bits[0]]=''
-		trans_polarized_csv_dict[Line_bits[0]]=''
-		trans_polarized_reduced_dict[Line_bits[0]]=''
-		trans_polarized_reduced_csv_dict[Line_bits[0]]=''
-	
-		Last_taxon=Line_bits[0] #keep resetting until the true last taxon.
-
-IN.close 
-
-if outgroup == None:  #If outgroup was not specified on command line, set outgroup to Last_taxon.
-	outgroup=Last_taxon
-	
-print "The outgroup taxon is %s." %(outgroup)
-
-#Go through the character dictionary character by character, and make the output binary dictionaries from this.
-char_count=1
-while char_count <= char_len :
-	#Get character of outgroup
-	out_char=char_dict[outgroup][(char_count-1):char_count].upper()  #Get the character and convert to uppercase
-	
-	#Go through rest of dictionary and get the characters present in other taxa at this position.
-	chars=[]
-	for key in char_dict :
-		tax_char=char_dict[key][(char_count-1):char_count].upper()
-		if (tax_char not in ambig_chars) and (tax_char not in chars) :
-			chars.append(tax_char)
-			
-	#print "Character %d of outgroup is character %s, other characters are: %s" %(char_count,out_char,chars)
-	
-	#For each character state that is present for this position compute the output as needed.
-	for character in chars :
-		for key in char_dict :		# For each taxon...
-			tax_char=char_dict[key][(char_count-1):char_count].upper()	#Get the character
-			if tax_char == character : # if the character in this taxon is the same as the current character state
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "1" #add a 1
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",1"
-				
-				if len(chars) > 1 :	#if position is not invariant, add to reduced dataset.
-					trans_bin_reduced_dict[key]=str(trans_bin_reduced_dict[key]) + "1" #add a 1
-					trans_bin_reduced_csv_dict[key]=str(trans_bin_reduced_csv_dict[key]) + ",1"
-					
-			elif tax_char in ambig_chars : #if character in this taxon is ambiguous
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "?" #add a ?
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",?"
-				if len(chars) > 1 :	#if position is not invariant, add to reduced dataset.
-					trans_bin_reduced_dict[key]=str(trans_bin_reduced_dict[key]) + "?" #add a ?
-					trans_bin_reduced_csv_dict[key]=str(trans_bin_reduced_csv_dict[key]) + ",?"
-		
-			else  : #otherwise add a 0
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "0" #add a 0
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",0"
-				if len(chars) > 1 :	#if position is not invariant, add to reduced dataset.
-					trans_bin_reduced_dict[key]=str(trans_bin_reduced_dict[key]) + "0" #add a 1
-					trans_bin_reduced_csv_dict[key]=str(trans_bin_reduced_csv_dict[key]) + ",0"
-	char_count+=1
-
-
-print (trans_bin_dict)
-#Go back though the binary matrix and create the polarized matrixes.
-char_len=len(trans_bin_dict[outgroup]) #need length of binary matrix
-
-char_count=1
-while char_count <= char_len :
-	#Get character of outgroup
-	out_char= trans_bin_dict[outgroup][(char_count-1):char_count]	#Get the binary state of the outgroup at this character
-	
-	for key in trans_bin_dict :		# For each taxon...
-
-		tax_char=trans_bin_dict[key][(char_count-1):char_count]	#Get the binary state of the character
-
-		if (out_char == "?") or (tax_char =="?") : #if outgroup or current taxon character is in the ambiguous list
-			trans_polarized_dict[key]=str(trans_polarized_dict[key]) + "?"
-			trans_polarized_csv_dict[key]=str(trans_polarized_csv_dict[key]) + ",?"
-	
-		elif tax_char == out_char :		#polarize for outgroup taxon: if = outgroup, then 0, else 1
-			trans_polarized_dict[key]=str(trans_polarized_dict[key]) + "0"
-			trans_polarized_csv_dict[key]=str(trans_polarized_csv_dict[key]) + ",0"
-		else :
-			trans_polarized_dict[key]=str(trans_polarized_dict[key]) + "1"
-			trans_polarized_csv_dict[key]=str(trans_polarized_csv_dict[key]) + ",1"
-
-	char_count+=1
-
-#For the reduced matrix, need to get the number of characters.
-char_len=len(trans_bin_reduced_dict[outgroup])
-char_count=1
-skipped=0
-while char_count <= char_len :
-	#Get character of outgroup
-	out_char= trans_bin_reduced_dict[outgroup][(char_count-1):char_count]	#Get the binary state of the outgroup at this character
-	
-	for key in trans_bin_reduced_dict :		# For each taxon...
-
-		tax_char= trans_bin_reduced_dict[key][(char_count-1):char_count]	#Get the binary state of the character
-		
-		if (out_char == "?") : #if outgroup character is ?
-			 skipped+=1 #Don't add to reduced polarized matrix. We don't do anything with this number for now, but need to have something in the if statement.
-	
-		elif (tax_char == "?") : #if the taxon state is ?
-			trans_polarized_reduced_dict[key]=str(trans_polarized_reduced_dict[key]) + "?"
-			trans_polarized_reduced_csv_dict[key]=str(trans_polarized_reduced_csv_dict[key]) + ",?"
-
-		elif tax_char == out_char :  #polarize for outgroup taxon: if = outgroup, then 0, else 1
-			trans_polarized_reduced_dict[key]=str(trans_polarized_reduced_dict[key]) + "0" #add a 0
-			trans_polarized_reduced_csv_dict[key]=str(trans_polarized_reduced_csv_dict[key]) + ",0"	
-	
-		else:
-			trans_polarized_reduced_dict[key]=str(trans_polarized_reduced_dict[key]) + "1" #add a 1
-			trans_polarized_reduced_csv_dict[key]=str(trans_polarized_reduced_csv_dict[key]) + ",1"	
-
-	char_count+=1
-			
-#to print everything in the same order, go back through the original file to get taxa to pull out of dictionary.
-try:
-	IN = open (in_file, 'r')
-except OSError as exception:
-	pass
-
-#Open all the output files.
-try:
-	OUT_BIN = open (out_bin_all, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN_CSV = open (out_bin_all_csv, 'w')
-except OSError as exception:
-	pass
-	
-try:
-	OUT_BIN_REDUCED = open (out_bin_reduced, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN_REDUCED_CSV = open (out_bin_reduced_csv, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN_POLARIZED = open (out_bin_polarized, 'w')
-except OSError as exception:
-	pass
-
+stats=Stats()
 try:
-	OUT_BIN_POLARIZED_CSV = open (out_bin_polarized_csv, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN_POLARIZED_REDUCED = open (out_bin_polarized_reduced, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN_POLARIZED_REDUCED_CSV = open (out_bin_polarized_reduced_csv, 'w')
-except OSError as exception:
-	pass
-
-
-#Add phylip headers to phylip output files, csv don't need header
-num_tax= len(trans_char_dict)
-
-OUT_BIN.write ("%d\t%d\n" %(num_tax,len(trans_bin_dict[Last_taxon])))
-OUT_BIN_REDUCED.write ("%d\t%d\n" %(num_tax,len(trans_bin_reduced_dict[Last_taxon])))
-OUT_BIN_POLARIZED.write ("%d\t%d\n" %(num_tax,len(trans_polarized_dict[Last_taxon])))
-OUT_BIN_POLARIZED_REDUCED.write ("%d\t%d\n" %(num_tax,len(trans_polarized_reduced_dict[Last_taxon])))
-
-
-for Line in IN :
-	if phylip.match(Line) : # If first line matches phylip header string defined above.
-		continue
-	else:
-		Line = Line.strip('\n')
-		Line_bits=re.split("\s+",Line)
-		if Line_bits[0] == '' :
-			continue
-		else : 
-			OUT_BIN.write ("%s\t%s\n" %(Line_bits[0],trans_bin_dict[Line_bits[0]]))
-			OUT_BIN_REDUCED.write ("%s\t%s\n" %(Line_bits[0],trans_bin_reduced_dict[Line_bits[0]]))
-			OUT_BIN_CSV.write ("%s\t%s\n" %(Line_bits[0],trans_bin_csv_dict[Line_bits[0]]))
-			OUT_BIN_REDUCED_CSV.write ("%s\t%s\n" %(Line_bits[0],trans_bin_reduced_csv_dict[Line_bits[0]]))
-			OUT_BIN_POLARIZED.write ("%s\t%s\n" %(Line_bits[0],trans_polarized_dict[Line_bits[0]]))
-			OUT_BIN_POLARIZED_CSV.write ("%s\t%s\n" %(Line_bits[0],trans_polarized_csv_dict[Line_bits[0]]))
-			OUT_BIN_POLARIZED_REDUCED.write ("%s\t%s\n" %(Line_bits[0],trans_polarized_reduced_dict[Line_bits[0]]))
-			OUT_BIN_POLARIZED_REDUCED_CSV.write ("%s\t%s\n" %(Line_bits[0],trans_polarized_reduced_csv_dict[Line_bits[0]]))
-
+	method1.run(in_file, out_file, ambig_chars, outgroup, npz=write_npz, stream=stream, window=window, n_jobs=n_jobs, log=print,
+		stats=stats, outputs=outputs, cache=cache, index=args.index, append=args.append,
+		compress=args.z, resampling=resampling, distance=args.distances,
+		checkpoint=args.checkpoint, resume=args.resume)
+except (ValueError, KeyError) as error:
+	print(error.args[0])
+	quit()
 
-print "\nFinished\n"
\ No newline at end of file
+if stats_file != None :
+	stats.write(stats_file)
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
 
 import argparse
-import re
+
+from binary_matrix import method2
+from binary_matrix.cache import DEFAULT_SIZE, ResultCache
+from binary_matrix.compress import COMPRESSIONS
+from binary_matrix.stats import Stats
+from binary_matrix.stream import WINDOW, WINDOW_CELLS
 
 ########################################################################################################################
 #
@@ -13,10 +18,35 @@ import re
 #	3)		: outfile
 #	4) The UIB file: uib.outfile 
 #	Usage: python make_binary_matrix.py -i infile -o outfile -g outgroup -p y
-#		-i: Input file, may be in phylip (non-interleaved) or simple text format.
+#		-i: Input file, may be in phylip (sequential or interleaved), FASTA, NEXUS or simple text format, recognised
+#			from its first line. --stream needs sequential phylip or simple text. gzip, bzip2 and xz compressed
+#			files are read directly (--stream decompresses them to a temporary file first).
 #		-o: output base see above for full names.
-#		-p: Phylip formated input: y or n: Default is y. Output will also be phylip formated.
+#		-p: Phylip formated input: y or n: Default is y. Output will also be phylip formated. FASTA and NEXUS input
+#			are recognised whatever -p is.
 #		-g: Outgroup taxon name, must be identical to name in file. If not supplied, last taxon is used.
+#		--stream: Memory-map the input and recode it in windows of --window sites, writing each window to the outputs
+#			as it is done. Memory use is bounded by taxa x window. By default a window has as many sites as fit in 2M
+#			cells (about 10000 sites for 200 taxa), at most 100000.
+#		-j: Number of processes. Blocks of --window sites are recoded in parallel and joined in order, the output is
+#			the same as with one process. Without --stream, as many threads then write the rows of each output.
+#		--stats: Write the wall and CPU time and peak memory of every stage, and the site and column counts, to a
+#			JSON file.
+#		--cache: Directory of a result cache. Outputs of an input file already recoded with the same options are
+#			copied from the cache instead of being recomputed; new outputs are added to it.
+#		--cache-size: Size limit of the cache in MB [10240]; least recently used outputs are removed beyond it.
+#		--cache-link: Hard-link outputs from the cache instead of copying them. They must then not be edited in place.
+#		-z: Compress the text outputs with gz (BGZF, readable by gzip and samtools/tabix), bz2 or xz; their names
+#			get the suffix. Blocks are compressed by -j threads while the outputs are being written.
+#		-v: Also print the outgroup base and the other bases of every site (one line per site, as before version 1.7).
+#		--checkpoint: With --stream, a directory the progress is saved to after every window: the outputs written so
+#			far are flushed to disk and a small manifest records the next window. A killed run only loses the window
+#			it was recoding. The directory is removed when the run finishes.
+#		--resume: Carry on from the last checkpoint in --checkpoint of a run of the same input, options and -o, keeping
+#			the windows already written to the outputs. Without a checkpoint there the run starts from the beginning.
+#
+#		There is no --append as in make_binary_matrix_Method_1.py: taxa added to an alignment are recoded by
+#			running the whole alignment again.
 ########################################################################################################################
 #
 #	Written by: Matt Gitzendanner
@@ -29,6 +59,15 @@ import re
 #
 # 	Versions:
 #		1.0: Sept. 24, 2013
+#		1.1: --stream mode for alignments that do not fit in memory.
+#		1.2: Sites are recoded in blocks by binary_matrix/uib.py, -j option to recode the blocks in parallel.
+#		1.3: The work is done by binary_matrix.method2.run(), the input is read only once.
+#		1.4: Interleaved phylip, FASTA and NEXUS input.
+#		1.5: --stats report.
+#		1.6: --cache of outputs.
+#		1.7: Sites are recoded all at once instead of one by one, the per-site lines are only printed with -v.
+#		1.8: gzip, bzip2 and xz compressed input, -z to compress the outputs.
+#		1.9: --checkpoint and --resume for --stream runs.
 #
 #
 ########################################################################################################################
@@ -39,7 +78,18 @@ parser = argparse.ArgumentParser()
 parser.add_argument("-i", help="Input matrix file")
 parser.add_argument("-o", help="Output matrix file")
 parser.add_argument("-g", help="Outgroup taxon name, if not used, last taxon in dataset is used.")
-parser.add_argument("-p",default='y', help="Input in phylip format (Note: Does not support interleaved data? [y] or n")
+parser.add_argument("-p",default='y', help="Input in phylip format [y] or n")
+parser.add_argument("--stream", action="store_true", help="Memory-map the input and recode it in windows of sites (bounded memory).")
+parser.add_argument("--window", type=int, help="Sites per window in --stream and -j modes [as many as fit in %d cells, at most %d]." %(WINDOW_CELLS, WINDOW))
+parser.add_argument("-j", type=int, default=1, help="Number of processes recoding blocks of sites in parallel [1].")
+parser.add_argument("--stats", help="Write per-stage timings, memory and column counts to this JSON file.")
+parser.add_argument("--cache", help="Directory of a cache of outputs keyed on the input and options.")
+parser.add_argument("--cache-size", type=int, default=DEFAULT_SIZE // 1024 ** 2, help="Cache size limit in MB [%d]." %(DEFAULT_SIZE // 1024 ** 2))
+parser.add_argument("--cache-link", action="store_true", help="Hard-link outputs from the cache instead of copying them.")
+parser.add_argument("-z", choices=COMPRESSIONS, help="Compress the text outputs (gz, bz2 or xz).")
+parser.add_argument("--checkpoint", help="With --stream, save the progress to this directory after every window.")
+parser.add_argument("--resume", action="store_true", help="Carry on from the last checkpoint of a stopped run.")
+parser.add_argument("-v", action="count", default=0, help="Print the bases of every site.")
 
 args = parser.parse_args()
 
@@ -47,159 +97,21 @@ in_file = args.i
 out_file = args.o
 outgroup = args.g
 phylip= args.p
-
-#Set output file names
-out_bin_file="binary." + out_file
-out_uib_file="uib." + out_file
-out_csv_file="binary." + out_file + ".csv"
-
-#Open the inputfile
+stream=args.stream
+window=args.window
+n_jobs=args.j
+stats_file=args.stats
+cache=ResultCache(args.cache, args.cache_size * 1024 ** 2, link=args.cache_link) if args.cache else None
+verbosity=args.v
+
+stats=Stats()
 try:
-	IN = open (in_file, 'r')
-except OSError as exception:
-	pass
-
-
-#Setup empty dictionaries to store sequences.
-seq_dict={}
-trans_seq_dict={}
-trans_bin_dict={}
-trans_bin_csv_dict={}
-trans_uib_dict={}
-
-seq_len=0
-
-if phylip == "y" or phylip == None :
-	IN.readline()   # skip the first line
-
-for Line in IN :		#Read in_file into a dictionary with keys as taxa and values as sequences (all sequences are same length)
-	Line = Line.strip('\n')
-	Line_bits=re.split("\s+",Line)
-	
-	if Line_bits[0] == '' :		#Skip blank lines
-		continue
-	if seq_len == 0 :				#Set Length from first sequence
-		seq_len = len(Line_bits[1])
-		print "All input sequences should be %s bases long." %(seq_len)
-	else :
-		if seq_len != len(Line_bits[1]) :
-			print "Error, %s has different sequence length (%d is not %d)" %(Line_bits[0], seq_len, len(Line_bits[1]) )	#if sequences are not the same exit.
-			break
-		
-	seq_dict[Line_bits[0]]=Line_bits[1]
-	trans_seq_dict[Line_bits[0]]=''			#Add the taxon names to all the dictionaries for output.
-	trans_bin_dict[Line_bits[0]]=''
-	trans_bin_csv_dict[Line_bits[0]]=''
-	trans_uib_dict[Line_bits[0]]=''
-	Last_taxon=Line_bits[0] #keep resetting until the true last taxon.
-
-IN.close 
-
-if outgroup == None:  #If outgroup was not specified on command line, set outgroup to Last_taxon.
-	outgroup=Last_taxon
-	
-print "The outgroup taxon is %s." %(outgroup)
-
-#Go through the sequence dictionary character by character, and make the output dictionaries from this.
-base_count=1
-while base_count <= seq_len :
-	#Get sequence of outgroup
-	out_base=seq_dict[outgroup][(base_count-1):base_count].upper()  #Get the base and convert to uppercase
-	#print out_base
-	#out_base=out_base[:base_count]
-	
-	#Go through rest of dictionary and get the bases present in other taxa.
-	bases=[]
-	for key in seq_dict :
-		tax_base=seq_dict[key][(base_count-1):base_count].upper()
-		if (tax_base != out_base) and (tax_base in ['G', 'A', 'T', 'C']) and (tax_base not in bases) :
-			bases.append(tax_base)
-		
-	print "Character %d of outgroup is base %s, other bases are: %s" %(base_count,out_base,bases)
-	
-	#For each base that is present for this character comput the output as needed.
-	for nuc in bases :
-		#print "Looking at %s in char %d" %(nuc,base_count)
-		#Go through rest of dictionary and get the transformed bases.
-		for key in seq_dict :		# For each taxon...
-			tax_base=seq_dict[key][(base_count-1):base_count].upper()	#Get the base
-			if tax_base == out_base :
-				trans_seq_dict[key]=str(trans_seq_dict[key]) + out_base		#Add base to growing transformed sequence
-				trans_uib_dict[key]=str(trans_uib_dict[key]) + out_base
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "0"
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",0"
-		
-			elif tax_base == nuc :
-				trans_seq_dict[key]=str(trans_seq_dict[key]) + nuc
-				trans_uib_dict[key]=str(trans_uib_dict[key]) + nuc
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "1"
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",1"
-				
-			else :
-				trans_seq_dict[key]=str(trans_seq_dict[key]) + "?"
-				trans_uib_dict[key]=str(trans_uib_dict[key]) + "?"
-				trans_bin_dict[key]=str(trans_bin_dict[key]) + "?"
-				trans_bin_csv_dict[key]=str(trans_bin_csv_dict[key]) + ",?"
-	
-	for key in seq_dict :			#Add extra column with Outgroup base or ? to the UIB dataset
-		tax_base=seq_dict[key][(base_count-1):base_count].upper()
-		if tax_base == out_base :
-			trans_uib_dict[key]=str(trans_uib_dict[key]) + out_base
-		else :
-			trans_uib_dict[key]=str(trans_uib_dict[key]) + "?"
-			
-	base_count+=1
-			
-
-#to print everything in the same order, go back through the original file to get taxa to pull out of dictionary.
-try:
-	IN = open (in_file, 'r')
-except OSError as exception:
-	pass
-
-#Open all the output files.
-try:
-	OUT_SEQ = open (out_file, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_BIN = open (out_bin_file, 'w')
-except OSError as exception:
-	pass
-
-try:
-	OUT_CSV = open (out_csv_file, 'w')
-except OSError as exception:
-	pass
-	
-	
-try:
-	OUT_UIB = open (out_uib_file, 'w')
-except OSError as exception:
-	pass
-
-if phylip == "y" or phylip == '':
-	num_tax= len(trans_seq_dict)
-
-	OUT_SEQ.write ("%d\t%d\n" %(num_tax,len(trans_seq_dict[Last_taxon])))
-	OUT_BIN.write ("%d\t%d\n" %(num_tax,len(trans_bin_dict[Last_taxon])))
-	OUT_UIB.write ("%d\t%d\n" %(num_tax,len(trans_uib_dict[Last_taxon])))
-	#CSV file shouldn't have phylip header.
-	
-	IN.readline()   # skip the first line
-
-for Line in IN :
-	Line = Line.strip('\n')
-	Line_bits=re.split("\s+",Line)
-	if Line_bits[0] == '' :
-		continue
-	else : 
-		OUT_SEQ.write ("%s\t%s\n" %(Line_bits[0],trans_seq_dict[Line_bits[0]]))
-		OUT_BIN.write ("%s\t%s\n" %(Line_bits[0],trans_bin_dict[Line_bits[0]]))
-		OUT_UIB.write ("%s\t%s\n" %(Line_bits[0],trans_uib_dict[Line_bits[0]]))
-		OUT_CSV.write ("%s%s\n" %(Line_bits[0],trans_bin_csv_dict[Line_bits[0]]))
-
-#OUT_SEQ.write ("Out\t%s\n" %(trans_seq_dict[Last_taxon]))
-#OUT_BIN.write ("Out\t%s\n" %(trans_bin_dict[Last_taxon]))
-#OUT_UIB.write ("Out\t%s\n" %(trans_uib_dict[Last_taxon]))
+	method2.run(in_file, out_file, outgroup, skip_first=(phylip == "y" or phylip == None), phylip=(phylip == "y" or phylip == ''),
+		stream=stream, window=window, n_jobs=n_jobs, log=print, stats=stats, cache=cache, verbosity=verbosity,
+		compress=args.z, checkpoint=args.checkpoint, resume=args.resume)
+except (ValueError, KeyError) as error:
+	print(error.args[0])
+	quit()
+
+if stats_file != None :
+	stats.write(stats_file)
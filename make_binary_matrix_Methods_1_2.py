@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import argparse
+
+from binary_matrix import combined
+from binary_matrix.compress import COMPRESSIONS
+from binary_matrix.engine import AMBIGUOUS
+from binary_matrix.stats import Stats
+from binary_matrix.stream import WINDOW, WINDOW_CELLS
+
+########################################################################################################################
+#
+#  make_binary_matrix_Methods_1_2.py
+#
+#  This script writes the outputs of make_binary_matrix_Method_1.py and make_binary_matrix_Method_2.py for the same
+#	alignment, reading it once and finding the character states of every site once for both methods:
+#	1-8) The Method 1 binary matrices (all, reduced, polarized, polarized reduced) as phylip and csv:
+#			outfile.binary.all.phy, outfile.binary.all.csv, ...
+#	9-12) The Method 2 matrices relative to the outgroup: outfile, binary.outfile, binary.outfile.csv, uib.outfile
+#
+#	Usage: python make_binary_matrix_Methods_1_2.py -i infile -o outfile -g outgroup -c DNA
+#		-i: Input file, in phylip (sequential or interleaved), FASTA, NEXUS or simple text format, recognised from its
+#			first line, possibly gzip, bzip2 or xz compressed.
+#		-c: Matrix character type (DNA, AA, or MULTI) of the Method 1 matrices. Default is DNA
+#		-a: Characters used for ambiguous or missing data, by default as for make_binary_matrix_Method_1.py.
+#		-o: output base see above for full names.
+#		-g: Outgroup taxon name. If not supplied, last taxon is used. Several outgroups may be given, comma separated
+#			or with -g repeated, to polarize the Method 1 matrices against each (see make_binary_matrix_Method_1.py);
+#			Method 2 is recoded relative to the first.
+#		--outputs: Comma separated Method 1 outputs to write, as for make_binary_matrix_Method_1.py.
+#		--npz: Also write the Method 1 matrices as bit-packed .npz files.
+#		-j: Number of processes. Blocks of --window sites are recoded for both methods in parallel and joined in order,
+#			the output is the same as with one process. As many threads then write the rows of each output.
+#		--stats: Write the wall and CPU time and peak memory of every stage, and the site and column counts, to a
+#			JSON file.
+#		-z: Compress the text outputs with gz, bz2 or xz; their names get the suffix.
+#		-v: Also print the outgroup base and the other bases of every site, as make_binary_matrix_Method_2.py -v.
+#
+#		--stream, --cache and the other options of the two scripts are only available in the scripts themselves.
+########################################################################################################################
+#
+# 	Versions:
+#		1.0: First version.
+#
+#
+########################################################################################################################
+
+version= "1.0"
+
+#Parse commandline options.
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", required=True, help="Input matrix file")
+parser.add_argument("-o", required=True, help="Output matrix file")
+parser.add_argument("-c",default="DNA", help="Matrix character type (DNA, AA, MULTI)")
+parser.add_argument("-a", help="Characters used for ambiguous or missing data")
+parser.add_argument("-g", action="append", help="Outgroup taxon name, if not used, last taxon in dataset is used. Repeat or separate with commas for several.")
+parser.add_argument("--outputs", help="Comma separated Method 1 outputs, e.g. polarized.reduced.phy or reduced [all matrices as phy and csv].")
+parser.add_argument("--npz", action="store_true", help="Also write the Method 1 matrices as bit-packed .npz files.")
+parser.add_argument("--window", type=int, help="Sites per block in -j mode [as many as fit in %d cells, at most %d]." %(WINDOW_CELLS, WINDOW))
+parser.add_argument("-j", type=int, default=1, help="Number of processes recoding blocks of sites in parallel [1].")
+parser.add_argument("--stats", help="Write per-stage timings, memory and column counts to this JSON file.")
+parser.add_argument("-z", choices=COMPRESSIONS, help="Compress the text outputs (gz, bz2 or xz).")
+parser.add_argument("-v", action="count", default=0, help="Print the bases of every site.")
+
+args = parser.parse_args()
+
+#Print some fancy output.
+print("\nmake_binary_matrix_Methods_1_2.py Verson: %s" %(version))
+print("Written by Matt Gitzendanner, University of Florida, Department of Biology\n")
+
+if args.c not in AMBIGUOUS :
+	print("Matrix character type was not set correctly %s is not one of the three options (DNA, AA, MULTI)." %(args.c))
+	quit()
+ambig_chars = list(AMBIGUOUS[args.c] if args.a == None else args.a)
+print("Matrix data type is: %s, characters treated as ambiguous or missing: %s" %(args.c, ambig_chars))
+outgroup = args.g
+if outgroup:
+	outgroup = [name for names in outgroup for name in names.split(",") if name]
+
+stats = Stats()
+try:
+	combined.run(args.i, args.o, ambig_chars, outgroup, outputs=args.outputs.split(",") if args.outputs else None,
+		npz=args.npz, window=args.window, n_jobs=args.j, log=print, stats=stats, verbosity=args.v, compress=args.z)
+except (ValueError, KeyError) as error:
+	print(error.args[0])
+	quit()
+
+if args.stats != None :
+	stats.write(args.stats)
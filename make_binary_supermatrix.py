@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import argparse
+
+from binary_matrix import batch
+from binary_matrix.engine import AMBIGUOUS
+from binary_matrix.stats import Stats
+
+########################################################################################################################
+#
+#  make_binary_supermatrix.py
+#
+#  This script takes many gene alignments (loci) as the input, recodes each one as make_binary_matrix_Method_1.py
+#	does and outputs 3 files:
+#	1,2) The concatenated binary supermatrix as phylip and csv: outfile.phy, outfile.csv
+#			Taxa missing from a locus are ? in all of the locus' columns.
+#	3) A partition file with the binary columns of every locus: outfile.partitions
+#
+#	Usage: python make_binary_supermatrix.py -o outfile [-c DNA] [-m all] [-j 4] locus.phy ... or directory
+#		Inputs: Alignment files (phylip, FASTA, NEXUS or simple text, possibly gzip, bzip2 or xz compressed), or
+#			directories of them. Loci are concatenated in the order given, files of a directory in name order.
+#		-c: Matrix character type (DNA, AA, or MULTI). Default is DNA
+#		-a: Characters used for ambiguous or missing data, by default as for make_binary_matrix_Method_1.py.
+#		-m: Matrix to concatenate: all, reduced, polarized or polarized.reduced. Default is all.
+#		-g: Outgroup taxon name for the polarized matrices, the same for every locus. If not supplied, the last taxon of
+#			the first locus that is in every locus is used. Loci without the outgroup are left out (and reported).
+#		-j: Number of processes recoding loci in parallel, and of threads writing the rows of the outputs.
+#		--stats: Write the wall and CPU time and peak memory of every stage, and the site and column counts, to a
+#			JSON file.
+########################################################################################################################
+#
+# 	Versions:
+#		1.0: First version.
+#		1.1: --stats report.
+#		1.2: One outgroup for all of the loci of a polarized supermatrix.
+#
+#
+########################################################################################################################
+
+#Parse commandline options.
+parser = argparse.ArgumentParser()
+parser.add_argument("inputs", nargs="+", help="Alignment files or directories of alignment files")
+parser.add_argument("-o", required=True, help="Output supermatrix file base")
+parser.add_argument("-c",default="DNA", help="Matrix character type (DNA, AA, MULTI)")
+parser.add_argument("-a", help="Characters used for ambiguous or missing data")
+parser.add_argument("-m",default="all", choices=batch.MATRICES, help="Matrix to concatenate [all]")
+parser.add_argument("-g", help="Outgroup taxon name, if not used, last taxon of the first locus that is in every locus is used.")
+parser.add_argument("-j", type=int, default=1, help="Number of processes recoding loci in parallel [1].")
+parser.add_argument("--stats", help="Write per-stage timings, memory and column counts to this JSON file.")
+
+args = parser.parse_args()
+
+if args.c not in AMBIGUOUS :
+	print("Matrix character type was not set correctly %s is not one of the three options (DNA, AA, MULTI)." %(args.c))
+	quit()
+ambig_chars = AMBIGUOUS[args.c] if args.a == None else args.a
+print("Matrix data type is: %s, characters treated as ambiguous or missing: %s" %(args.c, list(ambig_chars)))
+
+stats = Stats()
+try:
+	batch.run(args.inputs, args.o, ambig_chars, args.m, args.g, n_jobs=args.j, log=print, stats=stats)
+except ValueError as error:
+	print(error.args[0])
+	quit()
+
+if args.stats != None :
+	stats.write(args.stats)